@@ -1,20 +1,143 @@
-﻿import tkinter as tk
-from tkinter import ttk, messagebox, Text
-import json
+﻿import json
 import os
-import requests
 import re
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import uuid
 import base64
-import gspread
-from google.oauth2.service_account import Credentials
+import collections
+import time
+import random
+import threading
+import queue
+import bisect
+import itertools
+import unicodedata
+import sys
+import zlib
+import concurrent.futures
+import argparse
+import csv
+import logging
+import signal
+from dataclasses import dataclass
+# Chế độ dòng lệnh (python DeTai.py sync|export|import|stats) chạy được cả khi không có tkinter
+try:
+    import tkinter as tk
+    from tkinter import ttk, messagebox, Text
+except ImportError:
+    tk = ttk = messagebox = Text = None
+try:
+    import sqlite3
+except ImportError:
+    sqlite3 = None
+# gspread, google-auth và requests nặng nên chỉ import khi cần (connect_sheet_api, fetch_sample_tasks),
+# màn hình cấu hình và đăng nhập hiện ra mà không phải chờ chúng
 
 # File để lưu trữ dữ liệu
 TASKS_FILE = "tasks.json"
 USERS_FILE = "users.json"
 HISTORY_FILE = "task_history.json"
+HISTORY_LOG_FILE = "task_history.jsonl"
 CONFIG_FILE = "config.json"
+OUTBOX_FILE = "outbox.jsonl"
+DATABASE_FILE = "tasks.db"
+
+# Chu kỳ (ms) giao diện kiểm tra kết quả từ luồng đồng bộ nền
+SYNC_POLL_INTERVAL_MS = 200
+SYNC_STATE_LABELS = {
+    "pending": "Đang chờ",
+    "synced": "Đã đồng bộ",
+    "failed": "Lỗi"
+}
+# Thời gian (ms) chờ trước khi gửi lại outbox sau khi mất kết nối
+OUTBOX_RETRY_MS = 30000
+# Khi không kết nối được lúc khởi động: thời gian (ms) chờ trước lần thử lại đầu tiên, tăng gấp đôi tới tối đa
+RECONCILE_RETRY_MS = 5000
+RECONCILE_RETRY_MAX_MS = 300000
+# Thời gian (ms) gom các thay đổi liên tiếp vào cùng một lượt ghi outbox
+OUTBOX_COALESCE_MS = 500
+# Chu kỳ (giây) thăm dò sheet Phân công để thấy thay đổi của người khác, 0 là tắt
+LIVE_POLL_SECONDS = 60
+
+# Giới hạn gọi Google Sheets API: số yêu cầu mỗi phút và số yêu cầu được gửi dồn một lúc
+SHEETS_REQUESTS_PER_MINUTE = 60
+SHEETS_BURST = 10
+# Thử lại khi gặp lỗi tạm thời (429, 5xx): số lần, thời gian chờ ban đầu và tối đa (giây), chờ tăng gấp đôi mỗi lần
+SHEETS_RETRY_LIMIT = 5
+SHEETS_BACKOFF_BASE_SECONDS = 1
+SHEETS_BACKOFF_MAX_SECONDS = 32
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+# Các lời gọi ghi không lặp lại an toàn: nếu yêu cầu đã được áp dụng mà mất phản hồi, gửi lại sẽ thêm trùng
+# dòng hoặc xóa nhầm dòng đang nằm ở số dòng cũ. Chúng chỉ được thử lại khi bị từ chối vì hạn mức (429);
+# lỗi khác làm lượt ghi outbox thất bại và lượt sau tìm lại số dòng rồi mới gửi
+UNSAFE_WORKSHEET_CALLS = {"append_row", "append_rows", "delete_rows"}
+UNSAFE_SPREADSHEET_CALLS = {"batch_update", "add_worksheet"}
+
+# Chia công việc ra nhiều worksheet (shard): "" là một sheet, "project" là mỗi dự án một sheet,
+# "hash" là TASK_SHARD_COUNT sheet theo băm ID. Danh mục shard nằm ở sheet "<tên sheet> - danh mục"
+TASK_SHARDING_LABELS = {"": "Không chia", "project": "Theo dự án", "hash": "Theo nhóm (băm ID)"}
+TASK_SHARD_COUNT = 8
+MANIFEST_HEADERS = ["Shard", "Sheet"]
+
+# Kích thước tối đa (byte) của một đoạn nhật ký lịch sử trước khi sang đoạn mới, và số mục mỗi trang khi xem
+HISTORY_SEGMENT_BYTES = 1024 * 1024
+HISTORY_PAGE_SIZE = 200
+HISTORY_ACTIONS = ["Created", "Updated", "Deleted"]
+
+# Chiều cao một dòng Treeview và số dòng dự phòng giữ thêm ở chế độ ảo
+TREE_ROW_HEIGHT = 30
+VIRTUAL_TREE_BUFFER = 20
+
+# Công việc sắp đến hạn nếu còn không quá 24 giờ; chu kỳ (ms) làm mới màu hạn chót
+NEAR_DEADLINE_SECONDS = 24 * 3600
+DEADLINE_REFRESH_MS = 60000
+
+# Trọng số của từng trường khi xếp hạng kết quả tìm kiếm (từ cao xuống thấp), và thời gian chờ (ms) khi gõ
+SEARCH_FIELD_WEIGHTS = {
+    "title": 5,
+    "project_name": 3,
+    "assignee": 3,
+    "description": 1,
+    "notes": 1
+}
+SEARCH_DEBOUNCE_MS = 250
+# Số kết quả tìm kiếm tối đa hiện lên danh sách, chỉ các kết quả điểm cao nhất được xếp hạng
+SEARCH_RESULT_LIMIT = 1000
+COMBINING_MARKS = re.compile("[\u0300-\u036f]")
+
+# Thứ tự cột của sheet Phân công và tên trường tương ứng của công việc
+TASK_HEADERS = [
+    "ID", "Title", "Description", "Assignee", "Project Name",
+    "Status", "Deadline", "Notes", "Created At",
+    "Created By", "Last Modified By", "Last Modified At"
+]
+TASK_FIELDS = [
+    "id", "title", "description", "assignee", "project_name",
+    "status", "deadline", "notes", "created_at",
+    "created_by", "last_modified_by", "last_modified_at"
+]
+
+# Nơi lưu các sheet cục bộ (SHEET_BACKEND = "local"), mỗi spreadsheet là một file JSON
+LOCAL_SHEETS_DIR = "local_sheets"
+# Khoảng thời gian (giây) tính hạn mức số lần gọi giả lập, giống hạn mức theo phút của Google Sheets API
+SHEET_QUOTA_WINDOW_SECONDS = 60
+
+# Nơi lưu access token của tài khoản dịch vụ để lần khởi động sau không phải đổi token lại;
+# token còn dưới TOKEN_EXPIRY_MARGIN_SECONDS giây là coi như hết hạn
+TOKEN_CACHE_FILE = "token_cache.json"
+TOKEN_EXPIRY_MARGIN_SECONDS = 300
+# Mã thoát của chế độ dòng lệnh (argparse dùng mã 2 khi sai cú pháp)
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+EXIT_NOT_CONFIGURED = 3
+
+# Số kết nối HTTP giữ sẵn (keep-alive) tới Google APIs, và số lượt gọi gần nhất dùng để tính độ trễ
+HTTP_POOL_SIZE = 10
+LATENCY_SAMPLE_SIZE = 500
+
+# Thứ tự cột của sheet Đăng nhập
+USER_HEADERS = ["Username", "Password", "Full Name", "Role"]
 
 # Hàm mã hóa và giải mã
 def encode_data(data):
@@ -26,6 +149,31 @@ def decode_data(encoded_data):
     except:
         return encoded_data
 
+# Hàm mã hóa/giải mã danh sách người dùng khi lưu xuống máy
+def encode_users(users):
+    encoded_users = {}
+    for username, info in users.items():
+        encoded_username = encode_data(username)
+        encoded_users[encoded_username] = {
+            "password": encode_data(info.password),
+            "role": info.role,
+            "full_name": encode_data(info.full_name)
+        }
+    return encoded_users
+
+def decode_users(encoded_users):
+    users = {}
+    for username, info in encoded_users.items():
+        try:
+            users[decode_data(username)] = User(
+                decode_data(info["password"]),
+                decode_data(info["full_name"]),
+                info["role"]
+            )
+        except:
+            users[username] = User(info.get("password", ""), info.get("full_name", ""), info.get("role", "user"))
+    return users
+
 # Hàm để đọc và ghi JSON
 def read_json(file_path, default_data):
     if os.path.exists(file_path):
@@ -38,21 +186,1474 @@ def read_json(file_path, default_data):
         write_json(file_path, default_data)
         return default_data
 
-def write_json(file_path, data):
+# Hàm ghi file JSON; lỗi được chuyển cho on_error (giao diện hiện hộp thoại), không có thì ghi log
+def write_json(file_path, data, on_error=None):
     try:
         with open(file_path, 'w') as file:
             json.dump(data, file, indent=4)
     except Exception as e:
-        messagebox.showerror("Lỗi", f"Không thể ghi file: {e}")
+        (on_error or logging.error)(f"Không thể ghi file: {e}")
+
+# Hàm đổi chuỗi thời gian "%Y-%m-%d %H:%M:%S" thành số giây epoch, trả về None nếu sai định dạng
+def parse_timestamp(value):
+    if not isinstance(value, str) or len(value) != 19 or value[10] != " ":
+        return None
+    try:
+        return int(datetime.fromisoformat(value).timestamp())
+    except ValueError:
+        return None
+
+# Hàm bỏ dấu tiếng Việt và chữ hoa để tìm kiếm ("Phân công" -> "phan cong")
+def fold_text(text):
+    text = unicodedata.normalize("NFD", text.lower()).replace("đ", "d")
+    return COMBINING_MARKS.sub("", text)
+
+def tokenize(text):
+    return re.findall(r"\w+", fold_text(text))
+
+# Chỉ mục đảo cho tìm kiếm toàn văn: từ -> {điểm: {ID công việc: None}}, nhóm theo điểm để gộp và xếp hạng bằng dict.update
+class SearchIndex:
+    # Từ cuối ngắn hơn độ dài này chỉ khớp trọn từ; chỉ lọc lại ứng viên khi số ứng viên nhỏ hơn ngưỡng
+    MIN_PREFIX_LENGTH = 2
+    CANDIDATE_FILTER_LIMIT = 2000
+
+    def __init__(self, tasks=None):
+        self._postings = {}
+        self._doc_tokens = {}
+        self._vocabulary = []
+        if tasks:
+            # Nạp cả danh sách: danh sách từ được sắp xếp một lần thay vì chèn từng từ
+            for task in tasks:
+                self._add_tokens(task)
+            self._vocabulary = sorted(self._postings)
+
+    def add(self, task):
+        self.remove(task.id)
+        for token in self._add_tokens(task):
+            bisect.insort(self._vocabulary, token)
+
+    # Thêm các từ của công việc, trả về các từ lần đầu xuất hiện trong chỉ mục
+    def _add_tokens(self, task):
+        # Mỗi từ lấy trọng số của trường cao nhất chứa nó
+        tokens = {}
+        for field, weight in SEARCH_FIELD_WEIGHTS.items():
+            value = getattr(task, field)
+            if value:
+                for token in tokenize(value):
+                    if token not in tokens:
+                        tokens[token] = weight
+        self._doc_tokens[task.id] = tokens
+        new_tokens = []
+        for token, score in tokens.items():
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = {}
+                new_tokens.append(token)
+            posting.setdefault(score, {})[task.id] = None
+        return new_tokens
+
+    def remove(self, task_id):
+        for token, score in self._doc_tokens.pop(task_id, {}).items():
+            posting = self._postings[token]
+            level = posting[score]
+            del level[task_id]
+            if not level:
+                del posting[score]
+            if not posting:
+                del self._postings[token]
+                del self._vocabulary[bisect.bisect_left(self._vocabulary, token)]
+
+    # Trả về danh sách ID xếp theo điểm giảm dần (tối đa limit ID), hoặc None nếu truy vấn rỗng.
+    # Từ cuối cùng được khớp theo tiền tố để tìm ngay khi đang gõ. Khi đang gõ (typing) từ cuối quá ngắn được
+    # bỏ qua như chưa gõ xong; khi bấm Tìm/Enter thì nó được khớp trọn từ
+    def search(self, query, limit=None, typing=False):
+        tokens = tokenize(query)
+        if typing and tokens and len(tokens[-1]) < self.MIN_PREFIX_LENGTH:
+            tokens.pop()
+        if not tokens:
+            return None
+
+        # Ước lượng số kết quả của từng từ để giao từ tập nhỏ nhất trước
+        terms = []
+        for position, token in enumerate(tokens):
+            if position == len(tokens) - 1 and len(token) >= self.MIN_PREFIX_LENGTH:
+                words = self._prefix_words(token)
+            else:
+                words = [token] if token in self._postings else []
+            size = sum(len(level) for word in words for level in self._postings[word].values())
+            if not size:
+                return []
+            terms.append((size, token, words))
+        terms.sort(key=lambda term: term[0])
+        if len(terms) == 1:
+            return self._rank(self._levels(*terms[0][1:]), limit)
+
+        # Giao theo từng nhóm điểm bằng phép giao tập hợp thay vì cộng điểm cho từng ID. Một ID có thể nằm
+        # trong nhiều nhóm (khớp nhiều từ cùng tiền tố); khi nối kết quả theo điểm giảm dần chỉ lần gặp đầu được giữ
+        groups = self._groups(*terms[0][1:])
+        for position, (size, token, words) in enumerate(terms[1:], start=2):
+            if len(words) > 1 and sum(len(task_ids) for _, task_ids in groups) < min(size, self.CANDIDATE_FILTER_LIMIT):
+                term_groups = self._filter_prefix(set().union(*(task_ids for _, task_ids in groups)), token)
+            else:
+                term_groups = self._groups(token, words)
+            pairs = [(score + term_score, task_ids, term_ids)
+                     for score, task_ids in groups for term_score, term_ids in term_groups]
+            pairs.sort(key=lambda pair: pair[0], reverse=True)
+            if position == len(terms):
+                # Từ cuối (tập lớn nhất) chỉ được giao khi _rank cần thêm kết quả
+                return self._rank(((score, task_ids & term_ids) for score, task_ids, term_ids in pairs), limit)
+            groups = [(score, common) for score, common in
+                      ((score, task_ids & term_ids) for score, task_ids, term_ids in pairs) if common]
+            if not groups:
+                return []
+
+    def _prefix_words(self, token):
+        start = bisect.bisect_left(self._vocabulary, token)
+        end = bisect.bisect_left(self._vocabulary, token + "\uffff")
+        return self._vocabulary[start:end]
+
+    # Các nhóm (điểm, {ID: None}) của các từ khớp, điểm giảm dần; khớp tiền tố được nửa số điểm so với khớp trọn từ
+    def _levels(self, token, words):
+        levels = [(score if word == token else score / 2, level)
+                  for word in words for score, level in self._postings[word].items()]
+        levels.sort(key=lambda level: level[0], reverse=True)
+        return levels
+
+    # Nối các nhóm (điểm, tập ID) đã xếp theo điểm giảm dần: ID gặp trước giữ điểm cao nhất, dừng khi đủ limit
+    def _rank(self, groups, limit=None):
+        task_ids = itertools.chain.from_iterable(task_ids for _, task_ids in groups)
+        if limit is None:
+            return list(dict.fromkeys(task_ids))
+        ranked = {}
+        for task_id in task_ids:
+            ranked[task_id] = None
+            if len(ranked) >= limit:
+                break
+        return list(ranked)
+
+    # Các nhóm (điểm, tập ID) của một từ; dùng thẳng keys() của chỉ mục nên không sao chép ID
+    def _groups(self, token, words):
+        return [(score, level.keys()) for score, level in self._levels(token, words)]
+
+    def _filter_prefix(self, candidates, token):
+        groups = {}
+        for task_id in candidates:
+            best = 0
+            for word, score in self._doc_tokens[task_id].items():
+                if word == token:
+                    best = max(best, score)
+                elif word.startswith(token):
+                    best = max(best, score / 2)
+            if best:
+                groups.setdefault(best, set()).add(task_id)
+        return list(groups.items())
+
+# Hàm đổi số giây epoch thành chuỗi "%Y-%m-%d %H:%M:%S"
+def format_timestamp(timestamp):
+    return datetime.fromtimestamp(timestamp).strftime("%Y-%m-%d %H:%M:%S")
+
+# Các trường của công việc lặp lại nhiều giữa các công việc, được intern để dùng chung một chuỗi
+TASK_INTERNED_FIELDS = ("assignee", "project_name", "status", "created_by", "last_modified_by")
+
+# Một công việc: các trường theo đúng thứ tự cột TASK_FIELDS, thời gian lưu bằng số giây epoch
+@dataclass
+class Task:
+    __slots__ = tuple(TASK_FIELDS)
+    id: str
+    title: str
+    description: str
+    assignee: str
+    project_name: str
+    status: str
+    deadline: int
+    notes: str
+    created_at: int
+    created_by: str
+    last_modified_by: str
+    last_modified_at: int
+
+    def __post_init__(self):
+        for field in TASK_INTERNED_FIELDS:
+            setattr(self, field, sys.intern(getattr(self, field)))
+
+    # Đọc một dòng của sheet Phân công, trả về None nếu dòng không hợp lệ
+    @classmethod
+    def from_row(cls, row):
+        if len(row) < 9 or not row[0].strip():
+            return None
+        now = int(datetime.now().timestamp())
+        return cls(
+            row[0],
+            row[1],
+            row[2],
+            row[3],
+            row[4],
+            row[5] if row[5] in ["Todo", "In Progress", "Done"] else "Todo",
+            parse_timestamp(row[6]) or now + 7 * 86400,
+            row[7],
+            parse_timestamp(row[8]) or now,
+            row[9] if len(row) > 9 else "System",
+            row[10] if len(row) > 10 else "System",
+            parse_timestamp(row[11]) if len(row) > 11 and parse_timestamp(row[11]) else now
+        )
+
+    # Đọc công việc dạng dict (file JSON cũ, outbox) với thời gian dạng chuỗi
+    @classmethod
+    def from_dict(cls, data):
+        return cls.from_row([str(data.get(field, "")) for field in TASK_FIELDS])
+
+    # Một dòng của sheet Phân công, theo thứ tự TASK_HEADERS
+    def to_row(self):
+        return [
+            self.id,
+            self.title,
+            self.description,
+            self.assignee,
+            self.project_name,
+            self.status,
+            format_timestamp(self.deadline),
+            self.notes,
+            format_timestamp(self.created_at),
+            self.created_by,
+            self.last_modified_by,
+            format_timestamp(self.last_modified_at)
+        ]
+
+    def to_dict(self):
+        return dict(zip(TASK_FIELDS, self.to_row()))
+
+# Một người dùng (tên đăng nhập là khóa của self.users)
+@dataclass
+class User:
+    __slots__ = ("password", "full_name", "role")
+    password: str
+    full_name: str
+    role: str
+
+    def __post_init__(self):
+        self.role = sys.intern(self.role)
+
+# Hàm gom các số dòng thành các khoảng liên tiếp (start, end)
+def group_row_ranges(row_numbers):
+    ranges = []
+    for row_number in sorted(row_numbers):
+        if ranges and ranges[-1][1] == row_number - 1:
+            ranges[-1][1] = row_number
+        else:
+            ranges.append([row_number, row_number])
+    return [(start, end) for start, end in ranges]
+
+# Hàm xóa nhiều dòng của worksheet trong một yêu cầu: gộp thành các khoảng liên tiếp và xóa từ dưới lên
+# để số dòng của các khoảng phía trên không bị lệch
+def delete_sheet_rows(worksheet, row_numbers):
+    requests = [
+        {"deleteDimension": {"range": {
+            "sheetId": worksheet.id,
+            "dimension": "ROWS",
+            "startIndex": start - 1,
+            "endIndex": end
+        }}}
+        for start, end in reversed(group_row_ranges(row_numbers))
+    ]
+    if requests:
+        worksheet.spreadsheet.batch_update({"requests": requests})
+
+# Hàm đổi ô A1 ("B12", hoặc chỉ cột "A") thành (cột, dòng); dòng là None nếu không có
+def parse_a1(cell):
+    match = re.match(r"([A-Z]+)(\d*)$", cell)
+    column = 0
+    for letter in match.group(1):
+        column = column * 26 + ord(letter) - 64
+    return column, int(match.group(2)) if match.group(2) else None
+
+# Kho công việc trong bộ nhớ: chỉ mục theo ID và chỉ mục phụ theo các trường hay lọc
+class TaskStore:
+    INDEXED_FIELDS = ("assignee", "project_name", "status")
+    GROUPED_FIELDS = ("assignee", "project_name")
+
+    def __init__(self, tasks=None):
+        self._tasks = {}
+        self._indexes = {field: {} for field in self.INDEXED_FIELDS}
+        # Danh sách hạn chót (epoch) đã sắp xếp của các công việc chưa xong
+        self._deadline_keys = []
+        self._deadline_ids = []
+        # Số công việc theo trạng thái của từng người phụ trách và từng dự án
+        self._status_counts = {field: {} for field in self.GROUPED_FIELDS}
+        # Chỉ mục tìm kiếm được dựng ở luồng nền sau khi nạp; trong lúc dựng, ID các công việc đổi được ghi lại
+        self._search_index = None
+        self._search_pending = None
+        if tasks:
+            self._add_all(tasks)
+
+    def __len__(self):
+        return len(self._tasks)
+
+    def __iter__(self):
+        return iter(self._tasks.values())
+
+    def __contains__(self, task_id):
+        return task_id in self._tasks
+
+    def get(self, task_id):
+        return self._tasks.get(task_id)
+
+    # Thêm công việc, hoặc thay bản cũ nếu đã có công việc cùng ID
+    def add(self, task):
+        previous = self._tasks.get(task.id)
+        if previous is not None:
+            self._unindex(previous)
+        self._tasks[task.id] = task
+        self._index(task)
+        return task
+
+    def update(self, task_id, changes):
+        task = self._tasks[task_id]
+        self._unindex(task)
+        for field, value in changes.items():
+            setattr(task, field, sys.intern(value) if field in TASK_INTERNED_FIELDS else value)
+        self._index(task)
+        return task
+
+    def remove(self, task_id):
+        task = self._tasks.pop(task_id, None)
+        if task:
+            self._unindex(task)
+        return task
+
+    # Lọc theo các trường có chỉ mục, chỉ duyệt nhóm nhỏ nhất
+    def filter(self, **criteria):
+        buckets = []
+        for field, value in criteria.items():
+            bucket = self._indexes[field].get(value)
+            if not bucket:
+                return []
+            buckets.append(bucket)
+        if not buckets:
+            return self.to_list()
+        buckets.sort(key=len)
+        smallest, others = buckets[0], buckets[1:]
+        return [task for task_id, task in smallest.items()
+                if all(task_id in bucket for bucket in others)]
+
+    def distinct(self, field):
+        return list(self._indexes[field])
+
+    def search(self, query, limit=None, typing=False):
+        if self._search_index is None:
+            # Tìm trước khi luồng nền dựng xong: dựng luôn tại chỗ, bỏ kết quả từ luồng nền
+            self._search_index = SearchIndex(self._tasks.values())
+            self._search_pending = None
+        return self._search_index.search(query, limit, typing)
+
+    # Bắt đầu dựng chỉ mục tìm kiếm ở nơi khác: trả về danh sách công việc hiện có để đưa cho build_search_index
+    def begin_search_index(self):
+        self._search_pending = set()
+        return list(self._tasks.values())
+
+    # Dựng chỉ mục từ danh sách đã lấy (chạy trên luồng nền), trả về kèm kho để gắn đúng kho đã yêu cầu
+    def build_search_index(self, tasks):
+        return self, SearchIndex(tasks)
+
+    # Gắn chỉ mục dựng xong từ luồng nền, cập nhật lại các công việc đã đổi trong lúc dựng
+    def attach_search_index(self, index):
+        if self._search_index is not None or self._search_pending is None:
+            return
+        for task_id in self._search_pending:
+            task = self._tasks.get(task_id)
+            if task is None:
+                index.remove(task_id)
+            else:
+                index.add(task)
+        self._search_index = index
+        self._search_pending = None
+
+    def count(self, field, value):
+        return len(self._indexes[field].get(value, ()))
+
+    def groups(self, field):
+        return sorted(self._status_counts[field])
+
+    def projects(self):
+        return self.groups("project_name")
+
+    def status_counts(self, field, value):
+        return self._status_counts[field].get(value, collections.Counter())
+
+    # Số công việc quá hạn theo từng giá trị của field, chỉ duyệt các công việc đã quá hạn
+    def overdue_by(self, field, now):
+        return collections.Counter(getattr(self._tasks[task_id], field) for task_id in self.overdue_ids(now))
+
+    def overdue_count(self, now):
+        return bisect.bisect_right(self._deadline_keys, now)
+
+    def near_deadline_count(self, now):
+        return bisect.bisect_right(self._deadline_keys, now + NEAR_DEADLINE_SECONDS) - self.overdue_count(now)
+
+    # ID các công việc chưa xong có hạn chót trong khoảng (start, end]
+    def deadline_between(self, start, end):
+        low = bisect.bisect_right(self._deadline_keys, start)
+        high = bisect.bisect_right(self._deadline_keys, end)
+        return self._deadline_ids[low:high]
+
+    def overdue_ids(self, now):
+        return self._deadline_ids[:bisect.bisect_right(self._deadline_keys, now)]
+
+    def near_deadline_ids(self, now):
+        return self.deadline_between(now, now + NEAR_DEADLINE_SECONDS)
+
+    def to_list(self):
+        return list(self._tasks.values())
+
+    # Nạp cả danh sách lúc khởi tạo: danh sách hạn chót được sắp xếp một lần thay vì chèn từng công việc
+    def _add_all(self, tasks):
+        for task in tasks:
+            previous = self._tasks.get(task.id)
+            if previous is not None:
+                self._unindex(previous)
+            self._tasks[task.id] = task
+            self._index(task, keep_sorted=False)
+        pending = sorted((task for task in self._tasks.values() if task.status != "Done"), key=lambda task: task.deadline)
+        self._deadline_keys = [task.deadline for task in pending]
+        self._deadline_ids = [task.id for task in pending]
+
+    def _index(self, task, keep_sorted=True):
+        for field, index in self._indexes.items():
+            index.setdefault(getattr(task, field), {})[task.id] = task
+        for field, groups in self._status_counts.items():
+            groups.setdefault(getattr(task, field), collections.Counter())[task.status] += 1
+        if keep_sorted and task.status != "Done":
+            position = bisect.bisect_right(self._deadline_keys, task.deadline)
+            self._deadline_keys.insert(position, task.deadline)
+            self._deadline_ids.insert(position, task.id)
+        if self._search_index is not None:
+            self._search_index.add(task)
+        elif self._search_pending is not None:
+            self._search_pending.add(task.id)
+
+    def _unindex(self, task):
+        for field, index in self._indexes.items():
+            value = getattr(task, field)
+            bucket = index.get(value)
+            if bucket is not None:
+                bucket.pop(task.id, None)
+                if not bucket:
+                    del index[value]
+        for field, groups in self._status_counts.items():
+            value = getattr(task, field)
+            counts = groups.get(value)
+            if counts is not None:
+                counts[task.status] -= 1
+                if counts[task.status] <= 0:
+                    del counts[task.status]
+                if not counts:
+                    del groups[value]
+        # Gọi trước khi sửa công việc nên task.deadline và task.status vẫn là giá trị lúc đưa vào chỉ mục
+        if task.status != "Done":
+            position = bisect.bisect_left(self._deadline_keys, task.deadline)
+            while position < len(self._deadline_keys) and self._deadline_keys[position] == task.deadline:
+                if self._deadline_ids[position] == task.id:
+                    del self._deadline_keys[position]
+                    del self._deadline_ids[position]
+                    break
+                position += 1
+        if self._search_index is not None:
+            self._search_index.remove(task.id)
+        elif self._search_pending is not None:
+            self._search_pending.add(task.id)
+
+# Hàm đọc các dòng của file từ cuối lên đầu theo từng khối, không đọc cả file vào bộ nhớ
+def read_lines_reversed(file_path, block_size=65536):
+    with open(file_path, 'rb') as file:
+        file.seek(0, os.SEEK_END)
+        position = file.tell()
+        remainder = b""
+        while position > 0:
+            size = min(block_size, position)
+            position -= size
+            file.seek(position)
+            lines = (file.read(size) + remainder).split(b"\n")
+            remainder = lines.pop(0)
+            for line in reversed(lines):
+                if line.strip():
+                    yield line
+        if remainder.strip():
+            yield remainder
+
+# Hàm kiểm tra một mục lịch sử có khớp bộ lọc không (bộ lọc rỗng là không lọc)
+def history_matches(entry, user="", task_id="", action=""):
+    return ((not user or entry.get("user") == user)
+            and (not task_id or entry.get("task_id") == task_id)
+            and (not action or entry.get("action") == action))
+
+# Hàm lấy ngày thứ Hai ("%Y-%m-%d") của tuần chứa một thời điểm dạng chuỗi, None nếu không hợp lệ
+def week_of(value):
+    timestamp = parse_timestamp(value)
+    if timestamp is None:
+        return None
+    day = datetime.fromtimestamp(timestamp).date()
+    return (day - timedelta(days=day.weekday())).isoformat()
+
+# Số công việc hoàn thành theo tuần, tính từ lịch sử: một lần hoàn thành là một mục lịch sử
+# có trạng thái Done mà mục trước đó của cùng công việc chưa Done
+class CompletionCounter:
+    def __init__(self):
+        self.weeks = collections.Counter()
+        self._status = {}
+
+    # Dựng từ lịch sử đọc từ mới đến cũ: giữ mục mới hơn của mỗi công việc để so với mục cũ hơn liền trước
+    def load(self, entries):
+        newer = {}
+        for entry in entries:
+            task_id = entry.get("task_id")
+            self._status.setdefault(task_id, entry.get("status"))
+            if task_id in newer and self._is_completion(newer[task_id], entry.get("status")):
+                self._count(newer[task_id])
+            newer[task_id] = entry
+        for entry in newer.values():
+            if self._is_completion(entry, None):
+                self._count(entry)
+
+    # Cập nhật khi ghi thêm một mục lịch sử
+    def record(self, entry):
+        previous = self._status.get(entry["task_id"])
+        self._status[entry["task_id"]] = entry.get("status")
+        if self._is_completion(entry, previous):
+            self._count(entry)
+
+    def _is_completion(self, entry, previous_status):
+        return entry.get("action") != "Deleted" and entry.get("status") == "Done" and previous_status != "Done"
+
+    def _count(self, entry):
+        week = week_of(entry.get("timestamp"))
+        if week:
+            self.weeks[week] += 1
+
+# Nhật ký lịch sử dạng JSON Lines chỉ ghi nối thêm. Khi file hiện tại vượt quá max_bytes
+# thì đổi tên thành một đoạn đánh số (task_history.000001.jsonl, ...) và bắt đầu file mới
+class HistoryLog:
+    def __init__(self, file_path, max_bytes=HISTORY_SEGMENT_BYTES):
+        self.file_path = file_path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        base, extension = os.path.splitext(file_path)
+        self.segment_pattern = re.compile(re.escape(os.path.basename(base)) + r"\.(\d{6})" + re.escape(extension) + "$")
+        self.migrate_from_json()
+
+    # Chuyển task_history.json cũ sang nhật ký mới (chỉ chạy khi chưa có nhật ký)
+    def migrate_from_json(self):
+        if self.segments() or not os.path.exists(HISTORY_FILE):
+            return
+        history = read_json(HISTORY_FILE, [])
+        if history:
+            with open(self.file_path, 'a') as file:
+                for entry in history:
+                    file.write(json.dumps(entry) + "\n")
+            logging.info(f"Đã chuyển {len(history)} mục lịch sử từ {HISTORY_FILE} sang {self.file_path}")
+
+    def append(self, entry):
+        with self.lock:
+            with open(self.file_path, 'a') as file:
+                file.write(json.dumps(entry) + "\n")
+                size = file.tell()
+            if size >= self.max_bytes:
+                self._rotate()
+
+    # Danh sách file nhật ký từ cũ đến mới, file đang ghi nằm cuối
+    def segments(self):
+        directory = os.path.dirname(self.file_path) or "."
+        numbered = sorted(name for name in os.listdir(directory) if self.segment_pattern.match(name))
+        segments = [os.path.join(directory, name) for name in numbered]
+        if os.path.exists(self.file_path):
+            segments.append(self.file_path)
+        return segments
+
+    # Duyệt lịch sử từ mới đến cũ, chỉ đọc thêm khi cần
+    def iter_entries(self, user="", task_id="", action=""):
+        for segment in reversed(self.segments()):
+            try:
+                for line in read_lines_reversed(segment):
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        # Dòng ghi dở khi chương trình bị tắt đột ngột
+                        continue
+                    if history_matches(entry, user, task_id, action):
+                        yield entry
+            except FileNotFoundError:
+                # Đoạn vừa được đổi tên trong lúc đang đọc
+                continue
+
+    def _rotate(self):
+        numbered = [self.segment_pattern.match(os.path.basename(path)) for path in self.segments()[:-1]]
+        next_number = max([int(match.group(1)) for match in numbered] + [0]) + 1
+        base, extension = os.path.splitext(self.file_path)
+        os.replace(self.file_path, f"{base}.{next_number:06d}{extension}")
+
+# Lưu trữ bằng các file JSON: mỗi lần ghi là ghi lại cả file (dự phòng khi không dùng được SQLite)
+class JsonStorage:
+    def __init__(self, on_error=None):
+        self.on_error = on_error
+        self._tasks = {}
+        self._users = {}
+        self._history = HistoryLog(HISTORY_LOG_FILE)
+
+    def load_tasks(self):
+        tasks = [task for task in map(Task.from_dict, read_json(TASKS_FILE, [])) if task]
+        self._tasks = {task.id: task for task in tasks}
+        return tasks
+
+    def upsert_tasks(self, tasks):
+        if not tasks:
+            return
+        for task in tasks:
+            self._tasks[task.id] = task
+        write_json(TASKS_FILE, [task.to_dict() for task in self._tasks.values()], self.on_error)
+
+    def delete_tasks(self, task_ids):
+        for task_id in task_ids:
+            self._tasks.pop(task_id, None)
+        write_json(TASKS_FILE, [task.to_dict() for task in self._tasks.values()], self.on_error)
+
+    def load_users(self):
+        self._users = decode_users(read_json(USERS_FILE, {}))
+        return self._users
+
+    def save_users(self, users):
+        self._users = users
+        write_json(USERS_FILE, encode_users(users), self.on_error)
+
+    def save_user(self, username, info):
+        self._users[username] = info
+        write_json(USERS_FILE, encode_users(self._users), self.on_error)
+
+    def delete_users(self, usernames):
+        for username in usernames:
+            self._users.pop(username, None)
+        write_json(USERS_FILE, encode_users(self._users), self.on_error)
+
+    def append_history(self, entry):
+        self._history.append(entry)
+
+    def iter_history(self, user="", task_id="", action=""):
+        return self._history.iter_entries(user, task_id, action)
+
+# Lưu trữ bằng SQLite (chế độ WAL): thêm, sửa, xóa từng dòng thay vì ghi lại cả file
+class SqliteStorage:
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS tasks (
+            id TEXT PRIMARY KEY, title TEXT, description TEXT, assignee TEXT,
+            project_name TEXT, status TEXT, deadline TEXT, notes TEXT, created_at TEXT,
+            created_by TEXT, last_modified_by TEXT, last_modified_at TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_tasks_assignee ON tasks (assignee);
+        CREATE INDEX IF NOT EXISTS idx_tasks_project_name ON tasks (project_name);
+        CREATE INDEX IF NOT EXISTS idx_tasks_deadline ON tasks (deadline);
+        CREATE TABLE IF NOT EXISTS users (
+            username TEXT PRIMARY KEY, password TEXT, full_name TEXT, role TEXT
+        );
+        CREATE TABLE IF NOT EXISTS history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT, action TEXT, task_id TEXT,
+            title TEXT, user TEXT, timestamp TEXT, status TEXT
+        );
+        CREATE INDEX IF NOT EXISTS idx_history_task_id ON history (task_id);
+        CREATE INDEX IF NOT EXISTS idx_history_user ON history (user);
+        CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+    """
+    UPSERT_TASK = (
+        f"INSERT INTO tasks ({', '.join(TASK_FIELDS)}) VALUES ({', '.join('?' * len(TASK_FIELDS))}) "
+        f"ON CONFLICT(id) DO UPDATE SET {', '.join(f'{field} = excluded.{field}' for field in TASK_FIELDS[1:])}"
+    )
+    HISTORY_FIELDS = ["action", "task_id", "title", "user", "timestamp", "status"]
+
+    def __init__(self, db_path):
+        self.connection = sqlite3.connect(db_path, check_same_thread=False)
+        self.lock = threading.Lock()
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(self.SCHEMA)
+        # Cơ sở dữ liệu cũ chưa có cột trạng thái trong lịch sử
+        history_columns = [row[1] for row in self.connection.execute("PRAGMA table_info(history)")]
+        if "status" not in history_columns:
+            with self.connection:
+                self.connection.execute("ALTER TABLE history ADD COLUMN status TEXT")
+        self.migrate_from_json()
+
+    # Chuyển dữ liệu từ tasks.json, users.json và task_history.json sang SQLite (chỉ chạy một lần)
+    def migrate_from_json(self):
+        if self.connection.execute("SELECT 1 FROM meta WHERE key = 'migrated_from_json'").fetchone():
+            return
+        tasks = read_json(TASKS_FILE, []) if os.path.exists(TASKS_FILE) else []
+        tasks = [task for task in map(Task.from_dict, tasks) if task]
+        users = decode_users(read_json(USERS_FILE, {})) if os.path.exists(USERS_FILE) else {}
+        history = read_json(HISTORY_FILE, []) if os.path.exists(HISTORY_FILE) else []
+        with self.lock, self.connection:
+            self.connection.executemany(self.UPSERT_TASK, [self._task_values(task) for task in tasks])
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO users (username, password, full_name, role) VALUES (?, ?, ?, ?)",
+                [self._user_values(username, info) for username, info in users.items()]
+            )
+            self.connection.executemany(
+                f"INSERT INTO history ({', '.join(self.HISTORY_FIELDS)}) VALUES ({', '.join('?' * len(self.HISTORY_FIELDS))})",
+                [tuple(entry.get(field, "") for field in self.HISTORY_FIELDS) for entry in history]
+            )
+            self.connection.execute("INSERT INTO meta (key, value) VALUES ('migrated_from_json', ?)",
+                                    (datetime.now().strftime("%Y-%m-%d %H:%M:%S"),))
+        if tasks or users or history:
+            logging.info(f"Đã chuyển {len(tasks)} công việc, {len(users)} người dùng và {len(history)} lịch sử từ JSON sang SQLite")
+
+    def load_tasks(self):
+        rows = self.connection.execute(f"SELECT {', '.join(TASK_FIELDS)} FROM tasks ORDER BY rowid")
+        return [task for task in map(Task.from_row, rows) if task]
+
+    def upsert_tasks(self, tasks):
+        if not tasks:
+            return
+        with self.lock, self.connection:
+            self.connection.executemany(self.UPSERT_TASK, [self._task_values(task) for task in tasks])
+
+    def delete_tasks(self, task_ids):
+        with self.lock, self.connection:
+            self.connection.executemany("DELETE FROM tasks WHERE id = ?", [(task_id,) for task_id in task_ids])
+
+    def load_users(self):
+        rows = self.connection.execute("SELECT username, password, full_name, role FROM users ORDER BY rowid")
+        return decode_users({
+            username: {"password": password, "full_name": full_name, "role": role}
+            for username, password, full_name, role in rows
+        })
+
+    def save_users(self, users):
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM users")
+            self.connection.executemany(
+                "INSERT INTO users (username, password, full_name, role) VALUES (?, ?, ?, ?)",
+                [self._user_values(username, info) for username, info in users.items()]
+            )
+
+    def save_user(self, username, info):
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO users (username, password, full_name, role) VALUES (?, ?, ?, ?)",
+                self._user_values(username, info)
+            )
+
+    def delete_users(self, usernames):
+        with self.lock, self.connection:
+            self.connection.executemany("DELETE FROM users WHERE username = ?",
+                                        [(encode_data(username),) for username in usernames])
+
+    # Lấy một trang lịch sử từ mới đến cũ, chỉ gồm các mục có id nhỏ hơn before_id (nếu có)
+    def history_page(self, before_id=None, limit=HISTORY_PAGE_SIZE, user="", task_id="", action=""):
+        conditions, params = [], []
+        for column, value in (("id <", before_id), ("user =", user), ("task_id =", task_id), ("action =", action)):
+            if value:
+                conditions.append(f"{column} ?")
+                params.append(value)
+        where = f"WHERE {' AND '.join(conditions)} " if conditions else ""
+        rows = self.connection.execute(
+            f"SELECT id, {', '.join(self.HISTORY_FIELDS)} FROM history {where}ORDER BY id DESC LIMIT ?",
+            params + [limit]
+        ).fetchall()
+        return [dict(zip(["id"] + self.HISTORY_FIELDS, row)) for row in rows]
+
+    def iter_history(self, user="", task_id="", action=""):
+        before_id = None
+        while True:
+            page = self.history_page(before_id, HISTORY_PAGE_SIZE, user, task_id, action)
+            yield from page
+            if len(page) < HISTORY_PAGE_SIZE:
+                return
+            before_id = page[-1]["id"]
+
+    def append_history(self, entry):
+        with self.lock, self.connection:
+            self.connection.execute(
+                f"INSERT INTO history ({', '.join(self.HISTORY_FIELDS)}) VALUES ({', '.join('?' * len(self.HISTORY_FIELDS))})",
+                tuple(entry.get(field, "") for field in self.HISTORY_FIELDS)
+            )
+
+    def _task_values(self, task):
+        return tuple(task.to_row())
+
+    def _user_values(self, username, info):
+        return (encode_data(username), encode_data(info.password), encode_data(info.full_name), info.role)
+
+# Hàm chọn nơi lưu trữ theo STORAGE_BACKEND trong config.json, không mở được SQLite thì dùng JSON
+def open_storage(config, on_error=None):
+    if config.get("STORAGE_BACKEND", "sqlite") == "sqlite" and sqlite3 is not None:
+        try:
+            return SqliteStorage(DATABASE_FILE)
+        except sqlite3.Error as e:
+            logging.warning(f"Không thể mở cơ sở dữ liệu SQLite, chuyển sang lưu bằng JSON: {e}")
+    return JsonStorage(on_error)
+
+# Thống kê độ trễ các lượt gọi API: tổng số lượt, trung bình, lớn nhất và p50/p95 trên các lượt gần nhất
+class LatencyStats:
+    def __init__(self, sample_size=LATENCY_SAMPLE_SIZE):
+        self.lock = threading.Lock()
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples = collections.deque(maxlen=sample_size)
+
+    def record(self, seconds):
+        with self.lock:
+            self.count += 1
+            self.total += seconds
+            self.max = max(self.max, seconds)
+            self.samples.append(seconds)
+
+    # Trả về số lượt và các mốc độ trễ (ms), gọi được từ bất kỳ luồng nào
+    def summary(self):
+        with self.lock:
+            samples = sorted(self.samples)
+            count, total, longest = self.count, self.total, self.max
+        if not count:
+            return {"count": 0, "mean_ms": 0, "p50_ms": 0, "p95_ms": 0, "max_ms": 0}
+        return {
+            "count": count,
+            "mean_ms": round(total / count * 1000, 1),
+            "p50_ms": round(samples[len(samples) // 2] * 1000, 1),
+            "p95_ms": round(samples[min(len(samples) - 1, len(samples) * 95 // 100)] * 1000, 1),
+            "max_ms": round(longest * 1000, 1)
+        }
+
+# Hàm đọc access token đã lưu của tài khoản dịch vụ, trả về (token, hạn dùng UTC) hoặc None
+# nếu chưa có, của tài khoản/quyền khác hoặc sắp hết hạn
+def load_cached_token(file_path, account, scopes):
+    if not os.path.exists(file_path):
+        return None
+    cached = read_json(file_path, {})
+    if cached.get("account") != account or cached.get("scopes") != list(scopes):
+        return None
+    expiry = cached.get("expiry", 0)
+    if not cached.get("token") or expiry - TOKEN_EXPIRY_MARGIN_SECONDS <= time.time():
+        return None
+    # google-auth so sánh hạn dùng theo datetime UTC không kèm múi giờ
+    return cached["token"], datetime.fromtimestamp(expiry, timezone.utc).replace(tzinfo=None)
+
+# Hàm lưu access token với quyền 0600 (chỉ người dùng hiện tại đọc được)
+def save_cached_token(file_path, account, scopes, token, expiry):
+    data = {
+        "account": account,
+        "scopes": list(scopes),
+        "token": token,
+        "expiry": int(expiry.replace(tzinfo=timezone.utc).timestamp())
+    }
+    try:
+        fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        os.chmod(file_path, 0o600)
+        with os.fdopen(fd, 'w', encoding='utf-8') as file:
+            json.dump(data, file)
+    except OSError as e:
+        logging.warning(f"Không thể lưu access token: {e}")
+
+# Nguồn sheet là Google Sheets thật, qua gspread (import khi kết nối để khởi động nhanh).
+# Access token được lưu lại giữa các lần mở, mọi lượt gọi đi qua một phiên HTTP giữ kết nối và nén gzip
+class GspreadSheetBackend:
+    SCOPES = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
+
+    def __init__(self, credentials_file, token_cache_file=TOKEN_CACHE_FILE):
+        import gspread
+        import requests
+        from google.oauth2.service_account import Credentials
+        from google.auth.transport.requests import AuthorizedSession
+        
+        self.gspread = gspread
+        self.stats = LatencyStats()
+        self.token_cache_file = token_cache_file
+        self.token_lock = threading.Lock()
+        self.credentials = Credentials.from_service_account_file(credentials_file, scopes=self.SCOPES)
+        cached = load_cached_token(token_cache_file, self.credentials.service_account_email, self.SCOPES)
+        if cached:
+            self.credentials.token, self.credentials.expiry = cached
+        self.saved_token = self.credentials.token
+        
+        session = AuthorizedSession(self.credentials)
+        adapter = requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=HTTP_POOL_SIZE)
+        session.mount("https://", adapter)
+        # Google APIs chỉ nén phản hồi khi User-Agent có chữ "gzip"
+        session.headers.update({"Accept-Encoding": "gzip", "User-Agent": "DeTai (gzip)"})
+        session.hooks["response"].append(self.on_response)
+        self.client = gspread.Client(self.credentials, session=session)
+
+    # Sau mỗi phản hồi: ghi độ trễ (tới khi nhận xong tiêu đề phản hồi) và lưu token nếu vừa được cấp mới
+    def on_response(self, response, *args, **kwargs):
+        self.stats.record(response.elapsed.total_seconds())
+        if self.credentials.token != self.saved_token and self.credentials.expiry:
+            with self.token_lock:
+                if self.credentials.token != self.saved_token:
+                    self.saved_token = self.credentials.token
+                    save_cached_token(self.token_cache_file, self.credentials.service_account_email, self.SCOPES,
+                                      self.credentials.token, self.credentials.expiry)
+
+    def open_spreadsheet(self, spreadsheet_id):
+        return self.client.open_by_key(spreadsheet_id)
+
+    # Worksheet theo tên, None nếu chưa có (việc tạo mới do ứng dụng gọi riêng, không thử lại)
+    def find_worksheet(self, spreadsheet, title):
+        try:
+            return spreadsheet.worksheet(title)
+        except self.gspread.exceptions.WorksheetNotFound:
+            return None
+
+# Lỗi khi vượt hạn mức giả lập, mang mã 429 như lỗi của Google Sheets API
+class SheetQuotaExceeded(Exception):
+    code = 429
+
+# Nguồn sheet cục bộ thay cho Google Sheets để chạy không cần mạng hoặc đo số lần gọi API.
+# Có thể giả lập độ trễ mỗi lần gọi và hạn mức số lần đọc/ghi trong SHEET_QUOTA_WINDOW_SECONDS giây
+class LocalSheetBackend:
+    def __init__(self, directory=LOCAL_SHEETS_DIR, latency_ms=0, read_quota=0, write_quota=0):
+        self.directory = directory
+        self.latency = latency_ms / 1000
+        self.quotas = {"read": read_quota, "write": write_quota}
+        self.recent_calls = {"read": collections.deque(), "write": collections.deque()}
+        self.calls = collections.Counter()
+        self.stats = LatencyStats()
+        self.lock = threading.Lock()
+        self.spreadsheets = {}
+
+    def open_spreadsheet(self, spreadsheet_id):
+        with self.lock:
+            spreadsheet = self.spreadsheets.get(spreadsheet_id)
+            if spreadsheet is None:
+                path = os.path.join(self.directory, f"{spreadsheet_id}.json") if self.directory else None
+                spreadsheet = self.spreadsheets[spreadsheet_id] = LocalSpreadsheet(self, path)
+        return spreadsheet
+
+    def find_worksheet(self, spreadsheet, title):
+        try:
+            return spreadsheet.worksheet(title)
+        except KeyError:
+            return None
+
+    # Mỗi lần gọi API: đếm, kiểm tra hạn mức rồi chờ độ trễ giả lập
+    def request(self, name, kind):
+        with self.lock:
+            self.calls[name] += 1
+            limit = self.quotas[kind]
+            if limit:
+                now = time.monotonic()
+                recent = self.recent_calls[kind]
+                while recent and recent[0] <= now - SHEET_QUOTA_WINDOW_SECONDS:
+                    recent.popleft()
+                if len(recent) >= limit:
+                    raise SheetQuotaExceeded(f"Vượt hạn mức {limit} lần {'đọc' if kind == 'read' else 'ghi'} trong {SHEET_QUOTA_WINDOW_SECONDS} giây ({name})")
+                recent.append(now)
+        started = time.perf_counter()
+        if self.latency:
+            time.sleep(self.latency)
+        self.stats.record(time.perf_counter() - started)
+
+# Một spreadsheet cục bộ: các worksheet lưu chung trong một file JSON (None là chỉ giữ trong bộ nhớ)
+class LocalSpreadsheet:
+    def __init__(self, backend, path):
+        self.backend = backend
+        self.path = path
+        self.revision = 0
+        self.sheets = {}
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as file:
+                data = json.load(file)
+            self.revision = data["revision"]
+            for title, sheet in data["worksheets"].items():
+                self.sheets[title] = LocalWorksheet(self, title, sheet["id"], sheet["rows"])
+
+    def worksheet(self, title):
+        self.backend.request("worksheet", "read")
+        return self.sheets[title]
+
+    def worksheets(self):
+        self.backend.request("worksheets", "read")
+        return list(self.sheets.values())
+
+    def add_worksheet(self, title, rows=1000, cols=20):
+        self.backend.request("add_worksheet", "write")
+        worksheet = LocalWorksheet(self, title, len(self.sheets), [])
+        self.sheets[title] = worksheet
+        self.save()
+        return worksheet
+
+    # Đọc nhiều vùng dạng "'Tên sheet'!A:L" trong một yêu cầu, trả về như values.batchGet
+    def values_batch_get(self, ranges):
+        self.backend.request("values_batch_get", "read")
+        value_ranges = []
+        for value_range in ranges:
+            title, _, cells = value_range.rpartition("!")
+            if title.startswith("'"):
+                title = title[1:-1].replace("''", "'")
+            values = self.sheets[title]._get(cells)
+            value_ranges.append({"range": value_range, "values": values} if values else {"range": value_range})
+        return {"valueRanges": value_ranges}
+
+    def get_lastUpdateTime(self):
+        self.backend.request("get_lastUpdateTime", "read")
+        return str(self.revision)
+
+    # Chỉ hỗ trợ deleteDimension theo dòng, là loại yêu cầu duy nhất ứng dụng gửi
+    def batch_update(self, body):
+        self.backend.request("spreadsheet.batch_update", "write")
+        sheets = {worksheet.id: worksheet for worksheet in self.sheets.values()}
+        for request in body["requests"]:
+            sheet_range = request["deleteDimension"]["range"]
+            del sheets[sheet_range["sheetId"]].rows[sheet_range["startIndex"]:sheet_range["endIndex"]]
+        self.save()
+
+    # Ghi cả file qua file tạm để không hỏng dữ liệu khi bị tắt giữa chừng
+    def save(self):
+        self.revision += 1
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        data = {
+            "revision": self.revision,
+            "worksheets": {title: {"id": sheet.id, "rows": sheet.rows} for title, sheet in self.sheets.items()}
+        }
+        temp_path = self.path + ".tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(data, file, ensure_ascii=False)
+        os.replace(temp_path, self.path)
+
+LocalCell = collections.namedtuple("LocalCell", ["row", "col", "value"])
+
+# Worksheet cục bộ với cùng các hàm gspread.Worksheet mà ứng dụng dùng
+class LocalWorksheet:
+    def __init__(self, spreadsheet, title, sheet_id, rows):
+        self.spreadsheet = spreadsheet
+        self.title = title
+        self.id = sheet_id
+        self.rows = rows
+
+    def get_all_values(self):
+        self.spreadsheet.backend.request("get_all_values", "read")
+        width = max((len(row) for row in self.rows), default=0)
+        return [row + [""] * (width - len(row)) for row in self.rows]
+
+    def col_values(self, column):
+        self.spreadsheet.backend.request("col_values", "read")
+        values = [row[column - 1] if len(row) >= column else "" for row in self.rows]
+        while values and values[-1] == "":
+            values.pop()
+        return values
+
+    def find(self, query, in_column=None):
+        self.spreadsheet.backend.request("find", "read")
+        for row_number, row in enumerate(self.rows, start=1):
+            for column, value in enumerate(row, start=1):
+                if value == query and (in_column is None or column == in_column):
+                    return LocalCell(row_number, column, value)
+        return None
+
+    def batch_get(self, ranges):
+        self.spreadsheet.backend.request("batch_get", "read")
+        return [self._get(value_range) for value_range in ranges]
+
+    def update(self, values, range_name=None):
+        # Chấp nhận cả thứ tự tham số cũ update(range_name, values)
+        if isinstance(values, str):
+            values, range_name = range_name, values
+        self.spreadsheet.backend.request("update", "write")
+        self._set(range_name or "A1", values)
+        self.spreadsheet.save()
+
+    def batch_update(self, data):
+        self.spreadsheet.backend.request("batch_update", "write")
+        for item in data:
+            self._set(item["range"], item["values"])
+        self.spreadsheet.save()
+
+    def append_row(self, row):
+        self.spreadsheet.backend.request("append_row", "write")
+        self.rows.append([str(value) for value in row])
+        self.spreadsheet.save()
+
+    def append_rows(self, rows):
+        self.spreadsheet.backend.request("append_rows", "write")
+        self.rows.extend([str(value) for value in row] for row in rows)
+        self.spreadsheet.save()
+
+    def delete_rows(self, start_index, end_index=None):
+        self.spreadsheet.backend.request("delete_rows", "write")
+        del self.rows[start_index - 1:end_index or start_index]
+        self.spreadsheet.save()
+
+    def clear(self):
+        self.spreadsheet.backend.request("clear", "write")
+        self.rows = []
+        self.spreadsheet.save()
+
+    def _get(self, value_range):
+        first, _, last = value_range.partition(":")
+        first_column, first_row = parse_a1(first)
+        last_column, last_row = parse_a1(last or first)
+        first_row = first_row or 1
+        last_row = min(last_row or len(self.rows), len(self.rows))
+        values = []
+        for row in self.rows[first_row - 1:last_row]:
+            cells = row[first_column - 1:last_column]
+            # Như Google Sheets: bỏ các ô trống ở cuối dòng
+            while cells and cells[-1] == "":
+                cells.pop()
+            values.append(cells)
+        return values
+
+    def _set(self, value_range, values):
+        column, row_number = parse_a1(value_range.split(":")[0])
+        row_number = row_number or 1
+        for offset, cells in enumerate(values):
+            while len(self.rows) < row_number + offset:
+                self.rows.append([])
+            row = self.rows[row_number + offset - 1]
+            if len(row) < column - 1 + len(cells):
+                row.extend([""] * (column - 1 + len(cells) - len(row)))
+            row[column - 1:column - 1 + len(cells)] = [str(value) for value in cells]
+
+# Điều phối mọi lần gọi Sheets API: bucket token giới hạn tốc độ và thử lại với thời gian chờ
+# tăng dần (có thêm ngẫu nhiên) khi gặp lỗi 429/5xx hoặc lỗi mạng. Chạy trên luồng nền nên được phép chờ
+class SheetApiClient:
+    def __init__(self, requests_per_minute=SHEETS_REQUESTS_PER_MINUTE, burst=SHEETS_BURST,
+                 retry_limit=SHEETS_RETRY_LIMIT):
+        self.rate = requests_per_minute / 60
+        self.capacity = burst
+        self.tokens = float(burst)
+        self.updated_at = time.monotonic()
+        self.retry_limit = retry_limit
+        self.lock = threading.Lock()
+
+    # Lấy một token, chờ nếu bucket đang rỗng
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def call(self, func, *args, **kwargs):
+        return self._call(func, args, kwargs, is_retryable_error)
+
+    # Như call nhưng chỉ thử lại khi bị từ chối vì hạn mức, lúc đó yêu cầu chắc chắn chưa được áp dụng
+    def call_once(self, func, *args, **kwargs):
+        return self._call(func, args, kwargs, is_quota_error)
+
+    def _call(self, func, args, kwargs, retryable):
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                return func(*args, **kwargs)
+            except Exception as e:
+                if attempt >= self.retry_limit or not retryable(e):
+                    raise
+                delay = min(SHEETS_BACKOFF_MAX_SECONDS, SHEETS_BACKOFF_BASE_SECONDS * 2 ** attempt) + random.uniform(0, 1)
+                logging.warning(f"Lỗi tạm thời khi gọi Google Sheets API ({e}), thử lại sau {delay:.1f} giây")
+                time.sleep(delay)
+                attempt += 1
+
+# Hàm kiểm tra lỗi có nên thử lại không: lỗi hạn mức, lỗi máy chủ hoặc lỗi mạng
+def is_retryable_error(error):
+    return getattr(error, "code", None) in RETRYABLE_STATUS_CODES or isinstance(error, OSError)
+
+# Hàm kiểm tra lỗi vượt hạn mức (429)
+def is_quota_error(error):
+    return getattr(error, "code", None) == 429
+
+# Bọc worksheet/spreadsheet để mọi lời gọi hàm đi qua SheetApiClient; các lời gọi trong unsafe_calls
+# không được thử lại khi lỗi mạng hoặc lỗi máy chủ
+class ThrottledSheet:
+    def __init__(self, target, client, unsafe_calls=UNSAFE_WORKSHEET_CALLS):
+        self._target = target
+        self._client = client
+        self._unsafe_calls = unsafe_calls
+
+    def __getattr__(self, name):
+        value = getattr(self._target, name)
+        if name == "spreadsheet":
+            return ThrottledSheet(value, self._client, UNSAFE_SPREADSHEET_CALLS)
+        if callable(value):
+            call = self._client.call_once if name in self._unsafe_calls else self._client.call
+            return lambda *args, **kwargs: call(value, *args, **kwargs)
+        return value
+
+# Hàm đặt tên worksheet vào vùng A1 ("Phân công - A", "A:A" -> "'Phân công - A'!A:A")
+def sheet_range(title, cells):
+    return "'" + title.replace("'", "''") + "'!" + cells
+
+# Hàm xác định shard của một công việc theo cách chia ("" là không chia)
+def task_shard_key(task, mode, shard_count=TASK_SHARD_COUNT):
+    if mode == "project":
+        return task.project_name or "Default Project"
+    if mode == "hash":
+        return f"{zlib.crc32(task.id.encode('utf-8')) % shard_count:02d}"
+    return ""
+
+# Các shard của sheet Phân công (chạy trên luồng nền). Khi không chia chỉ có shard "" là chính sheet đó;
+# khi chia, sheet danh mục ghi khóa shard -> tên worksheet, shard mới được tạo khi ghi công việc đầu tiên.
+# Đọc nhiều shard gộp thành một yêu cầu values.batchGet thay vì mỗi shard một yêu cầu
+class TaskShards:
+    def __init__(self, spreadsheet, sheet, sheet_api=None, mode="", shard_count=TASK_SHARD_COUNT):
+        self.spreadsheet = spreadsheet
+        self.sheet_api = sheet_api
+        self.base_title = sheet.title
+        self.mode = mode
+        self.shard_count = shard_count
+        self.sheets = {}
+        self.manifest = None
+        if not mode:
+            self.sheets[""] = sheet
+            return
+        self.refresh()
+
+    # Đọc lại danh sách worksheet và sheet danh mục (chia shard), tạo sheet danh mục nếu chưa có
+    def refresh(self):
+        if not self.mode:
+            return
+        worksheets = {worksheet.title: worksheet for worksheet in self.spreadsheet.worksheets()}
+        self.titles = set(worksheets)
+        manifest_title = f"{self.base_title} - danh mục"
+        if manifest_title in worksheets:
+            self.manifest = self._wrap(worksheets[manifest_title])
+        else:
+            self.manifest = self._wrap(self.spreadsheet.add_worksheet(title=manifest_title, rows=1000, cols=2))
+            self.manifest.append_row(MANIFEST_HEADERS)
+            self.titles.add(manifest_title)
+        sheets = {}
+        for row in self.manifest.get_all_values()[1:]:
+            if len(row) >= 2 and row[1] in worksheets:
+                sheets[row[0]] = self._wrap(worksheets[row[1]])
+        self.sheets = sheets
+
+    def key_for(self, task):
+        return task_shard_key(task, self.mode, self.shard_count)
+
+    # Worksheet của shard, tạo mới và ghi vào danh mục nếu chưa có
+    def sheet_for(self, key):
+        sheet = self.sheets.get(key)
+        if sheet is None:
+            title = f"{self.base_title} - {key}"[:100]
+            suffix = 2
+            while title in self.titles:
+                title = f"{self.base_title} - {key}"[:95] + f" ({suffix})"
+                suffix += 1
+            sheet = self.sheets[key] = self._wrap(self.spreadsheet.add_worksheet(title=title, rows=1000, cols=20))
+            self.titles.add(title)
+            self.manifest.append_row([key, title])
+        return sheet
+
+    # Đọc các vùng [(khóa shard, "A1")] trong một yêu cầu
+    def get_ranges(self, ranges):
+        if not ranges:
+            return []
+        if len({key for key, _ in ranges}) == 1:
+            return list(self.sheets[ranges[0][0]].batch_get([cells for _, cells in ranges]))
+        response = self.spreadsheet.values_batch_get([sheet_range(self.sheets[key].title, cells) for key, cells in ranges])
+        return [value_range.get("values", []) for value_range in response.get("valueRanges", [])]
+
+    # Đọc hai cột ID và Last Modified At của các shard (mặc định tất cả), trả về danh sách
+    # (khóa shard, số dòng, ID, Last Modified At), hoặc None nếu có shard sai tiêu đề
+    def read_columns(self, keys=None):
+        keys = list(self.sheets) if keys is None else [key for key in keys if key in self.sheets]
+        values = self.get_ranges([(key, column) for key in keys for column in ("A:A", "L:L")])
+        columns = []
+        for index, key in enumerate(keys):
+            id_column, modified_column = values[2 * index], values[2 * index + 1]
+            # Shard trống (vừa tạo hoặc đã hết công việc) là shard không có dòng nào; riêng sheet Phân công
+            # khi không chia mà trống thì vẫn trả về None để tải lại toàn bộ
+            if key and not id_column and not modified_column:
+                continue
+            if not id_column or id_column[0] != ["ID"] or not modified_column or modified_column[0] != ["Last Modified At"]:
+                return None
+            for row_number, cell in enumerate(id_column[1:], start=2):
+                if not cell or not cell[0].strip():
+                    continue
+                modified = modified_column[row_number - 1] if row_number <= len(modified_column) else []
+                columns.append((key, row_number, cell[0], modified[0] if modified else ""))
+        return columns
+
+    # Đọc các dòng [(khóa shard, số dòng)], gom thành các khoảng liên tiếp của từng shard
+    def read_rows(self, locations):
+        row_numbers = {}
+        for key, row_number in locations:
+            row_numbers.setdefault(key, []).append(row_number)
+        ranges = [(key, f"A{start}:L{end}") for key, numbers in row_numbers.items()
+                  for start, end in group_row_ranges(sorted(numbers))]
+        rows = []
+        for value_range in self.get_ranges(ranges):
+            rows.extend(value_range)
+        return rows
+
+    # Đọc toàn bộ các shard thành một bảng có một dòng tiêu đề; shard sai tiêu đề bị xóa trắng
+    def read_all(self):
+        keys = list(self.sheets)
+        if keys == [""]:
+            data = self.sheets[""].get_all_values()
+            if data and data[0] != TASK_HEADERS:
+                self.sheets[""].clear()
+            return data
+        data = [TASK_HEADERS]
+        for key, values in zip(keys, self.get_ranges([(key, "A:L") for key in keys])):
+            if values and values[0] != TASK_HEADERS:
+                # Shard sai tiêu đề bị xóa trắng và bỏ qua các dòng của nó, để công việc trên máy được ghi lại vào shard
+                logging.warning(f"Tiêu đề shard '{key}' của sheet Phân công không đúng, sẽ ghi lại từ dữ liệu trên máy")
+                self.sheets[key].clear()
+                continue
+            data.extend(values[1:])
+        return data
+
+    # Vị trí hiện tại của các ID trên sheet {ID: (khóa shard, số dòng)} và các shard đã có dữ liệu
+    def locate_ids(self):
+        keys = list(self.sheets)
+        locations = {}
+        filled = set()
+        for key, column in zip(keys, self.get_ranges([(key, "A:A") for key in keys])):
+            if column:
+                filled.add(key)
+            for row_number, cell in enumerate(column[1:], start=2):
+                if cell and cell[0]:
+                    locations[cell[0]] = (key, row_number)
+        return locations, filled
+
+    def _wrap(self, worksheet):
+        return ThrottledSheet(worksheet, self.sheet_api) if self.sheet_api else worksheet
+
+# Hàm kiểm tra config.json đã đủ để kết nối: có ID hai spreadsheet và tệp credentials (sheet cục bộ thì không cần)
+def sheets_configured(config):
+    return all([
+        config["TASK_SPREADSHEET_ID"],
+        config["LOGIN_SPREADSHEET_ID"],
+        config.get("SHEET_BACKEND", "gspread") == "local" or os.path.exists(config["CREDENTIALS_FILE"])
+    ])
+
+# Các khóa config.json quyết định kết nối tới sheet: đổi một trong số này thì kết nối và mở sheet lại từ đầu
+SHEET_CONNECTION_KEYS = (
+    "SHEET_BACKEND", "CREDENTIALS_FILE", "TOKEN_CACHE_FILE", "LOCAL_SHEETS_DIR", "LOCAL_SHEET_LATENCY_MS",
+    "LOCAL_SHEET_READ_QUOTA", "LOCAL_SHEET_WRITE_QUOTA", "SHEETS_REQUESTS_PER_MINUTE",
+    "TASK_SPREADSHEET_ID", "TASK_SHEET_NAME", "LOGIN_SPREADSHEET_ID", "LOGIN_SHEET_NAME",
+    "TASK_SHARDING", "TASK_SHARD_COUNT"
+)
+
+# Hàm chọn nguồn sheet theo SHEET_BACKEND trong config.json: "gspread" (mặc định) hoặc "local"
+def open_sheet_backend(config):
+    if config.get("SHEET_BACKEND", "gspread") == "local":
+        return LocalSheetBackend(
+            config.get("LOCAL_SHEETS_DIR", LOCAL_SHEETS_DIR),
+            latency_ms=config.get("LOCAL_SHEET_LATENCY_MS", 0),
+            read_quota=config.get("LOCAL_SHEET_READ_QUOTA", 0),
+            write_quota=config.get("LOCAL_SHEET_WRITE_QUOTA", 0)
+        )
+    return GspreadSheetBackend(config["CREDENTIALS_FILE"], config.get("TOKEN_CACHE_FILE", TOKEN_CACHE_FILE))
+
+# Luồng nền thực hiện các thao tác ghi lên Google Sheets theo thứ tự, giao diện không phải chờ mạng
+class SheetSyncWorker:
+    def __init__(self):
+        self.operations = queue.Queue()
+        self.results = queue.Queue()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def submit(self, key, func, *args):
+        self.operations.put((key, func, args))
+
+    # Gửi kết quả trung gian từ một việc đang chạy, gọi được từ bất kỳ luồng nào
+    def post(self, key, state, result):
+        self.results.put((key, state, result))
+
+    # Lấy các kết quả đã xong mà không chặn, gọi từ luồng giao diện
+    def poll(self):
+        results = []
+        while True:
+            try:
+                results.append(self.results.get_nowait())
+            except queue.Empty:
+                return results
+
+    def _run(self):
+        while True:
+            key, func, args = self.operations.get()
+            try:
+                self.post(key, "synced", func(*args))
+            except Exception as e:
+                self.post(key, "failed", e)
+
+# Hàng đợi ghi bền vững (outbox.jsonl): mỗi thay đổi chưa lên sheet là một dòng JSON
+class Outbox:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.lock = threading.Lock()
+
+    def append(self, op, task):
+        self.append_many(op, [task])
+
+    # Ghi nhiều thay đổi cùng loại với một lần fsync
+    def append_many(self, op, tasks):
+        with self.lock:
+            with open(self.file_path, 'a') as file:
+                for task in tasks:
+                    file.write(json.dumps({"op": op, "task_id": task.id, "task": task.to_dict()}) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+
+    def entries(self):
+        with self.lock:
+            return self._read()
+
+    # Bỏ các dòng đầu đã ghi lên sheet, giữ lại các dòng thêm vào sau đó
+    def remove(self, count):
+        with self.lock:
+            remaining = self._read()[count:]
+            temp_path = self.file_path + ".tmp"
+            with open(temp_path, 'w') as file:
+                for entry in remaining:
+                    file.write(json.dumps(entry) + "\n")
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(temp_path, self.file_path)
+
+    def _read(self):
+        if not os.path.exists(self.file_path):
+            return []
+        entries = []
+        with open(self.file_path, 'r') as file:
+            for line in file:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    # Dòng ghi dở khi chương trình bị tắt đột ngột
+                    continue
+        return entries
+
+# Hàm gộp các thay đổi trong outbox: mỗi công việc chỉ còn thao tác cuối cùng,
+# thêm rồi xóa thì bỏ hẳn. Trả về danh sách (op, task_id, task) theo thứ tự xuất hiện
+def coalesce_outbox(entries):
+    ops = {}
+    for entry in entries:
+        task_id = entry["task_id"]
+        previous = ops.get(task_id)
+        if entry["op"] == "delete":
+            if previous and previous[0] == "append":
+                del ops[task_id]
+            else:
+                ops[task_id] = ("delete", entry["task"])
+        elif previous and previous[0] == "append":
+            ops[task_id] = ("append", entry["task"])
+        else:
+            ops[task_id] = (entry["op"], entry["task"])
+    return [(op, task_id, task) for task_id, (op, task) in ops.items()]
 
 # Hàm lấy dữ liệu mẫu từ API
 def fetch_sample_tasks():
     try:
+        import requests
         response = requests.get("https://jsonplaceholder.typicode.com/todos")
         if response.status_code == 200:
             tasks = response.json()[:5]
             formatted_tasks = [
-                {
+                Task.from_dict({
                     "id": str(uuid.uuid4()),
                     "title": task["title"],
                     "description": f"Sample task {task['id']}",
@@ -65,13 +1666,60 @@ def fetch_sample_tasks():
                     "project_name": "Default Project",
                     "last_modified_by": "System",
                     "last_modified_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                } for task in tasks
+                }) for task in tasks
             ]
             return formatted_tasks
     except:
         messagebox.showerror("Lỗi", "Không thể lấy dữ liệu từ API")
     return []
 
+# Chạy các thao tác nền ngay trên luồng gọi (chế độ dòng lệnh), kết quả vẫn lấy ra bằng poll
+class InlineSyncWorker(SheetSyncWorker):
+    def __init__(self):
+        self.results = queue.Queue()
+
+    def submit(self, key, func, *args):
+        try:
+            self.post(key, "synced", func(*args))
+        except Exception as e:
+            self.post(key, "failed", e)
+
+# Thay cho cửa sổ Tk khi chạy dòng lệnh: việc hẹn giờ bị bỏ qua vì HeadlessApp tự gọi từng bước
+class HeadlessRoot:
+    def after(self, ms, func=None, *args):
+        return None
+
+    def after_cancel(self, after_id):
+        pass
+
+# Hàm ghi công việc ra file: .csv theo cột của sheet Phân công, còn lại là JSON
+def export_tasks(tasks, file_path):
+    if file_path.lower().endswith(".csv"):
+        with open(file_path, 'w', encoding='utf-8-sig', newline='') as file:
+            writer = csv.writer(file)
+            writer.writerow(TASK_HEADERS)
+            writer.writerows(task.to_row() for task in tasks)
+    else:
+        with open(file_path, 'w', encoding='utf-8') as file:
+            json.dump([task.to_dict() for task in tasks], file, ensure_ascii=False, indent=4)
+
+# Hàm đọc công việc từ file .csv (dòng đầu là tiêu đề cột của sheet Phân công hoặc tên trường)
+# hoặc JSON (danh sách công việc), trả về danh sách dict theo tên trường
+def read_task_file(file_path):
+    if file_path.lower().endswith(".csv"):
+        with open(file_path, 'r', encoding='utf-8-sig', newline='') as file:
+            rows = list(csv.reader(file))
+        if not rows:
+            return []
+        fields = dict(zip(TASK_HEADERS, TASK_FIELDS))
+        columns = [fields.get(header.strip(), header.strip()) for header in rows[0]]
+        return [dict(zip(columns, row)) for row in rows[1:] if any(row)]
+    with open(file_path, 'r', encoding='utf-8') as file:
+        data = json.load(file)
+    if not isinstance(data, list) or not all(isinstance(item, dict) for item in data):
+        raise ValueError("File JSON phải là một danh sách công việc")
+    return data
+
 class ProjectManagementApp:
     def __init__(self, root):
         self.root = root
@@ -79,18 +1727,10 @@ class ProjectManagementApp:
         self.root.geometry("1160x700")
         self.current_user = None
         self.is_admin = False
-        
-        # Khởi tạo dữ liệu lịch sử
-        self.history = read_json(HISTORY_FILE, [])
-        
-        # Đọc cấu hình Google Sheets
-        self.config = read_json(CONFIG_FILE, {
-            "TASK_SPREADSHEET_ID": "",
-            "LOGIN_SPREADSHEET_ID": "",
-            "TASK_SHEET_NAME": "Phân công",
-            "LOGIN_SHEET_NAME": "Thông tin đăng nhập",
-            "CREDENTIALS_FILE": "taskmanager-credentials.json"
-        })
+        self.init_sync_state(SheetSyncWorker())
+        self.root.after(SYNC_POLL_INTERVAL_MS, self.poll_sync_results)
+        self.deadline_checked_at = int(datetime.now().timestamp())
+        self.root.after(DEADLINE_REFRESH_MS, self.refresh_deadline_tags)
         
         # Thiết lập theme
         self.style = ttk.Style()
@@ -101,7 +1741,7 @@ class ProjectManagementApp:
         self.style.configure('TButton', font=('Roboto', 11), padding=8)
         self.style.configure('TEntry', font=('Roboto', 11), padding=5)
         self.style.configure('Treeview.Heading', font=('Roboto', 12, 'bold'), background='#4CAF50', foreground='white')
-        self.style.configure('Treeview', font=('Roboto', 11), rowheight=30)
+        self.style.configure('Treeview', font=('Roboto', 11), rowheight=TREE_ROW_HEIGHT)
         
         # Tùy chỉnh màu button khi hover
         self.style.map('TButton',
@@ -109,41 +1749,301 @@ class ProjectManagementApp:
             foreground=[('active', 'white'), ('!active', 'white')]
         )
         
-        # Khởi tạo Google Sheets
-        self.SCOPES = ['https://www.googleapis.com/auth/spreadsheets', 'https://www.googleapis.com/auth/drive']
-        if not all([
-            self.config["TASK_SPREADSHEET_ID"],
-            self.config["LOGIN_SPREADSHEET_ID"],
-            os.path.exists(self.config["CREDENTIALS_FILE"])
-        ]):
+        # Khởi tạo Google Sheets (sheet cục bộ thì không cần tệp credentials)
+        if not sheets_configured(self.config):
             self.create_config_screen()
         else:
             self.setup_google_sheets()
 
+    #Đọc cấu hình, mở nơi lưu trên máy và trạng thái đồng bộ (dùng chung cho giao diện và dòng lệnh)
+    def init_sync_state(self, sync_worker):
+        # Đọc cấu hình Google Sheets
+        self.config = read_json(CONFIG_FILE, {
+            "TASK_SPREADSHEET_ID": "",
+            "LOGIN_SPREADSHEET_ID": "",
+            "TASK_SHEET_NAME": "Phân công",
+            "LOGIN_SHEET_NAME": "Thông tin đăng nhập",
+            "CREDENTIALS_FILE": "taskmanager-credentials.json",
+            "SYNC_MODE": "incremental",
+            "SYNC_WATERMARKS": {},
+            "TREE_VIRTUAL_THRESHOLD": 2000,
+            "STORAGE_BACKEND": "sqlite",
+            "SHEET_FINGERPRINTS": {},
+            "SHEET_BACKEND": "gspread",
+            "LOCAL_SHEET_LATENCY_MS": 0,
+            "LOCAL_SHEET_READ_QUOTA": 0,
+            "LOCAL_SHEET_WRITE_QUOTA": 0,
+            "SHEETS_REQUESTS_PER_MINUTE": SHEETS_REQUESTS_PER_MINUTE,
+            "LIVE_POLL_SECONDS": LIVE_POLL_SECONDS,
+            "TASK_SHARDING": "",
+            "TASK_SHARD_COUNT": TASK_SHARD_COUNT
+        })
+        
+        # Nơi lưu dữ liệu trên máy (SQLite hoặc JSON)
+        self.storage = open_storage(self.config, self.report_error)
+        
+        # Luồng đồng bộ nền và trạng thái đồng bộ của từng công việc
+        self.sync_worker = sync_worker
+        self.outbox = Outbox(OUTBOX_FILE)
+        self.outbox_flush_queued = False
+        self.outbox_flush_requested = False
+        self.reconciling = False
+        self.loading_users = False
+        self.reconcile_retry_ms = RECONCILE_RETRY_MS
+        # Số công việc hoàn thành theo tuần, dựng từ lịch sử khi mở thống kê lần đầu
+        self.completions = None
+        # Thăm dò thay đổi trên sheet: ID -> (shard, Last Modified At) của lần thăm dò trước
+        self.sheet_row_fingerprints = None
+        self.live_poll_queued = False
+        self.load_pending_writes()
+    #Các công việc còn trong outbox là đang chờ ghi lên sheet
+    def load_pending_writes(self):
+        self.sync_state = {}
+        self.pending_writes = {}
+        for entry in self.outbox.entries():
+            self.pending_writes[entry["task_id"]] = self.pending_writes.get(entry["task_id"], 0) + 1
+            self.sync_state[entry["task_id"]] = "pending"
+
+    #Khởi động ngay từ dữ liệu đã lưu trên máy, việc đối chiếu với Google Sheets chạy ở luồng nền.
+    #Chưa có người dùng nào trên máy thì hiện màn hình chờ đến khi tải xong sheet Đăng nhập
     def setup_google_sheets(self):
+        self.users = self.storage.load_users()
+        self.tasks = None
+        self.reconciling = True
+        self.loading_users = True
+        if self.users:
+            self.create_login_screen()
+        else:
+            self.create_splash_screen()
+        # Đăng nhập chỉ cần danh sách người dùng nên công việc được nạp sau khi màn hình đã hiện
+        self.root.after_idle(self.load_local_tasks)
+    #Nạp công việc từ bộ nhớ cục bộ rồi mới đối chiếu với Google Sheets
+    def load_local_tasks(self):
+        if self.tasks is not None:
+            return
+        self.tasks = TaskStore(self.storage.load_tasks())
+        # Chỉ mục tìm kiếm dựng trên luồng riêng để không phải chờ sau lượt đối chiếu qua mạng
+        threading.Thread(target=self.build_search_index, args=(self.tasks, self.tasks.begin_search_index()),
+                         daemon=True).start()
+        self.start_reconcile()
+    #Dựng chỉ mục tìm kiếm (chạy trên luồng riêng), gửi kết quả về luồng giao diện qua hàng đợi kết quả đồng bộ
+    def build_search_index(self, store, tasks):
         try:
-            creds = Credentials.from_service_account_file(self.config["CREDENTIALS_FILE"], scopes=self.SCOPES)
-            self.gspread_client = gspread.authorize(creds)
-            self.task_spreadsheet = self.gspread_client.open_by_key(self.config["TASK_SPREADSHEET_ID"])
-            try:
-                self.task_sheet = self.task_spreadsheet.worksheet(self.config["TASK_SHEET_NAME"])
-            except gspread.exceptions.WorksheetNotFound:
-                self.task_sheet = self.task_spreadsheet.add_worksheet(title=self.config["TASK_SHEET_NAME"], rows=1000, cols=20)
-            
-            self.login_spreadsheet = self.gspread_client.open_by_key(self.config["LOGIN_SPREADSHEET_ID"])
+            self.sync_worker.post("search_index", "synced", store.build_search_index(tasks))
+        except Exception as e:
+            self.sync_worker.post("search_index", "failed", e)
+    #Gửi lượt đối chiếu với Google Sheets cho luồng nền
+    def start_reconcile(self):
+        watermark = ""
+        local_ids = frozenset()
+        if self.config.get("SYNC_MODE", "incremental") == "incremental":
+            watermark = self.config.get("SYNC_WATERMARKS", {}).get(self.sync_watermark_key(), "")
+            if watermark:
+                local_ids = frozenset(task.id for task in self.tasks)
+        self.sync_worker.submit("reconcile", self.fetch_sheet_snapshot,
+                                dict(self.config.get("SHEET_FINGERPRINTS", {})), bool(self.users), bool(self.tasks),
+                                watermark, local_ids)
+    #Báo lỗi đồng bộ cho người dùng (chế độ dòng lệnh ghi log thay cho hộp thoại)
+    def report_error(self, message):
+        messagebox.showerror("Lỗi", message)
+    #Tạo nguồn sheet đã cấu hình và bộ giới hạn lượt gọi API (chạy trên luồng nền)
+    def connect_sheet_api(self):
+        self.sheet_backend = open_sheet_backend(self.config)
+        self.sheet_api = SheetApiClient(self.config.get("SHEETS_REQUESTS_PER_MINUTE", SHEETS_REQUESTS_PER_MINUTE))
+        self.sheet_connection = {key: self.config.get(key) for key in SHEET_CONNECTION_KEYS}
+        # Các sheet đã mở thuộc kết nối cũ
+        self.task_shards = None
+        self.login_sheet = None
+    #Kết nối khi chưa có hoặc cấu hình kết nối đã đổi; giữ phiên HTTP, token và bộ giới hạn lượt gọi giữa các lượt đồng bộ
+    def ensure_sheet_api(self):
+        connection = {key: self.config.get(key) for key in SHEET_CONNECTION_KEYS}
+        if getattr(self, "sheet_api", None) is None or connection != getattr(self, "sheet_connection", None):
+            self.connect_sheet_api()
+    #Mở sheet Phân công và danh mục shard của nó
+    def open_task_sheet(self):
+        task_spreadsheet = self.sheet_api.call(self.sheet_backend.open_spreadsheet, self.config["TASK_SPREADSHEET_ID"])
+        self.task_spreadsheet = ThrottledSheet(task_spreadsheet, self.sheet_api, UNSAFE_SPREADSHEET_CALLS)
+        self.task_sheet = self.open_worksheet(self.task_spreadsheet, self.config["TASK_SHEET_NAME"])
+        self.task_shards = TaskShards(self.task_spreadsheet, self.task_sheet, self.sheet_api,
+                                      self.config.get("TASK_SHARDING", ""),
+                                      self.config.get("TASK_SHARD_COUNT", TASK_SHARD_COUNT))
+    #Mở sheet Đăng nhập, tạo mới kèm dòng tiêu đề nếu chưa có
+    def open_login_sheet(self):
+        login_spreadsheet = self.sheet_api.call(self.sheet_backend.open_spreadsheet, self.config["LOGIN_SPREADSHEET_ID"])
+        self.login_spreadsheet = ThrottledSheet(login_spreadsheet, self.sheet_api, UNSAFE_SPREADSHEET_CALLS)
+        self.login_sheet = self.open_worksheet(self.login_spreadsheet, self.config["LOGIN_SHEET_NAME"], USER_HEADERS)
+    #Mở worksheet theo tên, tạo mới kèm dòng tiêu đề nếu chưa có. Mọi lời gọi đi qua bộ giới hạn; tạo sheet và
+    #ghi dòng tiêu đề không lặp lại an toàn nên chỉ thử lại khi bị giới hạn lượt gọi (429)
+    def open_worksheet(self, spreadsheet, title, headers=None):
+        worksheet = self.sheet_backend.find_worksheet(spreadsheet, title)
+        if worksheet is not None:
+            return ThrottledSheet(worksheet, self.sheet_api)
+        worksheet = ThrottledSheet(spreadsheet.add_worksheet(title=title, rows=1000, cols=20), self.sheet_api)
+        if headers:
+            worksheet.append_row(headers)
+        return worksheet
+    #Kết nối sheet Phân công khi cần (chạy trên luồng nền): lượt đối chiếu lúc khởi động có thể đã thất bại
+    def ensure_task_sheet(self):
+        self.ensure_sheet_api()
+        if getattr(self, "task_shards", None) is None:
+            self.open_task_sheet()
+    #Kết nối sheet Đăng nhập khi cần (chạy trên luồng nền)
+    def ensure_login_sheet(self):
+        self.ensure_sheet_api()
+        if getattr(self, "login_sheet", None) is None:
+            self.open_login_sheet()
+    #Dấu vân tay của spreadsheet (thời điểm sửa cuối theo Drive), None nếu không lấy được
+    def sheet_fingerprint(self, spreadsheet):
+        try:
+            return spreadsheet.get_lastUpdateTime()
+        except Exception as e:
+            logging.warning(f"Không lấy được thời điểm sửa cuối của Google Sheet, sẽ tải lại dữ liệu: {e}")
+            return None
+    #Báo bước khởi động đang chạy lên màn hình chờ/đăng nhập (gọi từ luồng nền)
+    def report_startup(self, step):
+        self.sync_worker.post("startup", "synced", step)
+    #Tải dữ liệu cần đối chiếu (chạy trên luồng nền): nhánh người dùng và nhánh công việc chạy song song.
+    #Nhánh người dùng gửi kết quả ngay khi xong để mở đăng nhập, nhánh công việc tiếp tục phía sau
+    def fetch_sheet_snapshot(self, fingerprints, have_users, have_tasks, watermark, local_ids):
+        self.ensure_sheet_api()
+        with concurrent.futures.ThreadPoolExecutor(max_workers=2) as pool:
+            tasks_future = pool.submit(self.fetch_tasks_snapshot, fingerprints, have_tasks, watermark, local_ids)
+            users_future = pool.submit(self.fetch_users_snapshot, fingerprints, have_users)
+            users_error = None
             try:
-                self.login_sheet = self.login_spreadsheet.worksheet(self.config["LOGIN_SHEET_NAME"])
-            except gspread.exceptions.WorksheetNotFound:
-                self.login_sheet = self.login_spreadsheet.add_worksheet(title=self.config["LOGIN_SHEET_NAME"], rows=1000, cols=20)
-                headers = ["Username", "Password", "Full Name", "Role"]
-                self.login_sheet.append_row(headers)
-            
-            self.sync_users_from_sheet()
-            self.sync_tasks_from_sheet()
+                self.sync_worker.post("reconcile_users", "synced", users_future.result())
+            except Exception as e:
+                users_error = e
+            snapshot = tasks_future.result()
+        snapshot["users_error"] = users_error
+        return snapshot
+    #Nhánh người dùng: mở sheet Đăng nhập, chỉ tải lại khi sheet đã đổi so với dấu vân tay lưu lần trước
+    def fetch_users_snapshot(self, fingerprints, have_users):
+        self.report_startup("Đang mở sheet Đăng nhập...")
+        self.ensure_login_sheet()
+        snapshot = {"fingerprints": {}, "users": None}
+        users_key = self.login_sheet_key()
+        users_fingerprint = self.sheet_fingerprint(self.login_spreadsheet)
+        if not users_fingerprint or users_fingerprint != fingerprints.get(users_key) or not have_users:
+            self.report_startup("Đang tải danh sách người dùng...")
+            snapshot["users"] = self.login_sheet.get_all_values()
+        snapshot["fingerprints"][users_key] = users_fingerprint
+        return snapshot
+    #Nhánh công việc: mở sheet Phân công, gửi outbox còn tồn rồi tải phần đã đổi
+    def fetch_tasks_snapshot(self, fingerprints, have_tasks, watermark, local_ids):
+        self.report_startup("Đang mở sheet Phân công...")
+        if getattr(self, "task_shards", None) is None:
+            self.open_task_sheet()
+        else:
+            # Sheet đã mở từ lượt trước: chỉ đọc lại danh mục để thấy shard do máy khác tạo
+            self.task_shards.refresh()
+        snapshot = {"flushed": self.flush_outbox(), "fingerprints": {}, "tasks": None}
+        tasks_key = self.sync_watermark_key()
+        tasks_fingerprint = self.sheet_fingerprint(self.task_spreadsheet)
+        # Trên máy chưa có công việc nào (xóa tasks.db, đổi STORAGE_BACKEND) thì luôn tải về dù sheet không đổi
+        if not tasks_fingerprint or tasks_fingerprint != fingerprints.get(tasks_key) or not have_tasks:
+            self.report_startup("Đang tải công việc...")
+            changes = self.fetch_task_changes(watermark, local_ids) if watermark else None
+            if changes is not None:
+                snapshot["tasks"] = ("incremental", changes)
+            else:
+                snapshot["tasks"] = ("full", self.task_shards.read_all())
+        snapshot["fingerprints"][tasks_key] = tasks_fingerprint
+        return snapshot
+    #Lưu dấu vân tay của các sheet vừa gộp xong; gộp lỗi thì không lưu để lần sau tải lại
+    def save_fingerprints(self, fingerprints):
+        self.config.setdefault("SHEET_FINGERPRINTS", {}).update(
+            {key: value for key, value in fingerprints.items() if value}
+        )
+        write_json(CONFIG_FILE, self.config, self.report_error)
+    #Gộp danh sách người dùng vừa tải về (chạy trên luồng giao diện), mở đăng nhập nếu màn hình chờ đang hiện
+    def apply_users_snapshot(self, snapshot):
+        self.loading_users = False
+        try:
+            if snapshot["users"] is not None:
+                self.sync_users_from_sheet(snapshot["users"])
+        except Exception as e:
+            self.report_error(f"Không thể đồng bộ người dùng từ Google Sheet: {e}")
+        else:
+            self.save_fingerprints(snapshot["fingerprints"])
+        if self.current_user is None and self.startup_splash_visible():
             self.create_login_screen()
+    #Gộp dữ liệu vừa tải về vào dữ liệu trên máy (chạy trên luồng giao diện)
+    def apply_sheet_snapshot(self, snapshot):
+        self.mark_outbox_flushed(snapshot["flushed"])
+        if snapshot["users_error"] is not None:
+            self.report_error(f"Không thể đồng bộ người dùng từ Google Sheet: {snapshot['users_error']}")
+        try:
+            if snapshot["tasks"] is not None:
+                mode, payload = snapshot["tasks"]
+                if mode == "incremental":
+                    self.sync_tasks_incremental(*payload)
+                else:
+                    self.sync_tasks_full(payload)
         except Exception as e:
-            messagebox.showerror("Lỗi", f"Không thể kết nối với Google Sheets: {e}")
+            self.report_error(f"Không thể đồng bộ công việc từ Google Sheet: {e}")
+        else:
+            self.save_fingerprints(snapshot["fingerprints"])
+        self.schedule_outbox_flush()
+        tree = getattr(self, "tree", None)
+        if self.current_user is not None and tree is not None and tree.winfo_exists():
+            self.load_tasks()
+            self.refresh_project_menu()
+            self.refresh_stats()
+    #Kết thúc lượt đối chiếu: cập nhật giao diện theo kết quả từ luồng nền
+    def finish_reconcile(self, state, result):
+        self.reconciling = False
+        self.loading_users = False
+        self.show_startup_step("")
+        if state == "failed":
+            if self.current_user is None and not self.users:
+                # Chưa có người dùng nào trên máy: có thể cấu hình sai, quay về màn hình cấu hình
+                self.report_error(f"Không thể kết nối với Google Sheets: {result}")
+                self.create_config_screen()
+                return
+            # Vẫn làm việc với dữ liệu trên máy, thử kết nối lại sau, chờ lâu dần
+            if self.reconcile_retry_ms == RECONCILE_RETRY_MS:
+                self.report_error(f"Không thể kết nối với Google Sheets: {result}")
+            else:
+                logging.warning(f"Không thể kết nối với Google Sheets: {result}")
+            self.show_startup_step(f"Chưa kết nối được Google Sheets, thử lại sau {self.reconcile_retry_ms // 1000} giây")
+            self.root.after(self.reconcile_retry_ms, self.retry_reconcile)
+            self.reconcile_retry_ms = min(self.reconcile_retry_ms * 2, RECONCILE_RETRY_MAX_MS)
+            return
+        self.reconcile_retry_ms = RECONCILE_RETRY_MS
+        self.apply_sheet_snapshot(result)
+        if self.current_user is None and self.startup_splash_visible():
+            # Không tải được người dùng và trên máy cũng chưa có ai
             self.create_config_screen()
+        self.schedule_live_poll()
+    #Thử lại lượt đối chiếu sau khi không kết nối được
+    def retry_reconcile(self):
+        self.reconciling = True
+        self.loading_users = not self.users
+        self.start_reconcile()
+    #Hiện bước khởi động đang chạy trên màn hình chờ hoặc màn hình đăng nhập
+    def show_startup_step(self, step):
+        reconcile_label = getattr(self, "reconcile_label", None)
+        if reconcile_label is not None and reconcile_label.winfo_exists():
+            reconcile_label.config(text=step)
+    #Màn hình chờ đang hiện hay không
+    def startup_splash_visible(self):
+        splash_frame = getattr(self, "splash_frame", None)
+        return splash_frame is not None and splash_frame.winfo_exists()
+    #Màn hình chờ khi mở ứng dụng lần đầu: chưa có người dùng trên máy nên phải đợi sheet Đăng nhập
+    def create_splash_screen(self):
+        self.clear_screen()
+        
+        self.splash_frame = ttk.Frame(self.root, padding=20, style='Main.TFrame')
+        self.splash_frame.pack(fill=tk.BOTH, expand=True)
+        self.style.configure('Main.TFrame', background='white')
+        
+        ttk.Label(self.splash_frame, text="Quản lý Công Việc Dự Án", font=('Roboto', 20, 'bold'), foreground='#4CAF50').pack(pady=(120, 20))
+        progress = ttk.Progressbar(self.splash_frame, mode='indeterminate', length=300)
+        progress.pack(pady=10)
+        progress.start(15)
+        self.reconcile_label = ttk.Label(self.splash_frame, text="Đang kết nối với Google Sheets...")
+        self.reconcile_label.pack(pady=5)
 
     def create_config_screen(self):
         self.clear_screen()
@@ -180,7 +2080,15 @@ class ProjectManagementApp:
         self.credentials_file_entry.insert(0, self.config["CREDENTIALS_FILE"])
         self.credentials_file_entry.grid(row=5, column=1, padx=5, pady=5)
         
-        ttk.Button(main_frame, text="Lưu cấu hình", command=self.save_config).grid(row=6, column=0, columnspan=2, pady=20)
+        self.local_sheet_var = tk.BooleanVar(value=self.config.get("SHEET_BACKEND", "gspread") == "local")
+        ttk.Checkbutton(main_frame, text="Dùng sheet cục bộ (không cần mạng)", variable=self.local_sheet_var).grid(row=6, column=1, padx=5, pady=5, sticky='w')
+        
+        ttk.Label(main_frame, text="Chia sheet Phân công").grid(row=7, column=0, padx=5, pady=5, sticky='e')
+        sharding_label = TASK_SHARDING_LABELS.get(self.config.get("TASK_SHARDING", ""), TASK_SHARDING_LABELS[""])
+        self.sharding_var = tk.StringVar(value=sharding_label)
+        ttk.OptionMenu(main_frame, self.sharding_var, sharding_label, *TASK_SHARDING_LABELS.values()).grid(row=7, column=1, padx=5, pady=5, sticky='w')
+        
+        ttk.Button(main_frame, text="Lưu cấu hình", command=self.save_config).grid(row=8, column=0, columnspan=2, pady=20)
 
     def create_login_screen(self):
         self.clear_screen()
@@ -207,6 +2115,8 @@ class ProjectManagementApp:
         # Nút đăng nhập và đăng ký
         ttk.Button(main_frame, text="Đăng nhập", command=self.login).pack(pady=10)
         ttk.Button(main_frame, text="Đăng ký", command=self.create_register_screen, style='Secondary.TButton').pack(pady=5)
+        self.reconcile_label = ttk.Label(main_frame, text="Đang đồng bộ dữ liệu với Google Sheets..." if self.reconciling else "")
+        self.reconcile_label.pack(pady=5)
         
         self.style.configure('Secondary.TButton', background='#2196F3', foreground='white')
         self.style.map('Secondary.TButton',
@@ -260,6 +2170,9 @@ class ProjectManagementApp:
         ttk.Label(search_frame, text="Tìm kiếm công việc").pack(side=tk.LEFT, padx=5)
         self.search_entry = ttk.Entry(search_frame, width=30)
         self.search_entry.pack(side=tk.LEFT, padx=5)
+        self.search_after_id = None
+        self.search_entry.bind("<KeyRelease>", self.on_search_typed)
+        self.search_entry.bind("<Return>", lambda event: self.search_tasks())
         ttk.Button(search_frame, text="Tìm", command=self.search_tasks).pack(side=tk.LEFT, padx=5)
     
         # Frame chọn dự án
@@ -267,9 +2180,10 @@ class ProjectManagementApp:
         project_frame.pack(fill=tk.X, pady=5)
         ttk.Label(project_frame, text="Dự án").pack(side=tk.LEFT, padx=5)
         self.project_var = tk.StringVar(value="Tất cả")
-        projects = ["Tất cả"] + list(set(task["project_name"] for task in self.tasks))
-        self.project_menu = ttk.OptionMenu(project_frame, self.project_var, "Tất cả", *projects, command=self.filter_tasks_by_project)
+        self.project_menu = ttk.OptionMenu(project_frame, self.project_var, "Tất cả", command=self.filter_tasks_by_project)
         self.project_menu.pack(side=tk.LEFT, padx=5)
+        self.project_menu_names = None
+        self.refresh_project_menu()
     
         # Frame chọn chế độ xem
         view_frame = ttk.Frame(main_frame)
@@ -278,22 +2192,31 @@ class ProjectManagementApp:
         ttk.Radiobutton(view_frame, text="Công việc của tôi", variable=self.view_mode, value="mine", command=self.load_tasks).pack(side=tk.LEFT, padx=10)
         ttk.Radiobutton(view_frame, text="Tất cả công việc", variable=self.view_mode, value="all", command=self.load_tasks).pack(side=tk.LEFT, padx=10)
     
+        # Dòng thống kê nhanh cho quản trị viên
+        self.stats_label = None
+        if self.is_admin:
+            self.stats_label = ttk.Label(main_frame, text="")
+            self.stats_label.pack(anchor="w", padx=5)
+            self.refresh_stats()
+    
         # Frame chứa Treeview
         tree_frame = ttk.Frame(main_frame)
         tree_frame.pack(fill=tk.BOTH, expand=True, pady=10)
-        self.tree = ttk.Treeview(tree_frame, columns=("ID", "Title", "Assignee", "Status", "Deadline", "Created At"), show="headings")
+        self.tree = ttk.Treeview(tree_frame, columns=("ID", "Title", "Assignee", "Status", "Deadline", "Created At", "Sync"), show="headings")
         self.tree.heading("ID", text="ID")
         self.tree.heading("Title", text="Tiêu đề")
         self.tree.heading("Assignee", text="Người phụ trách")
         self.tree.heading("Status", text="Trạng thái")
         self.tree.heading("Deadline", text="Hạn chót")
         self.tree.heading("Created At", text="Ngày tạo")
+        self.tree.heading("Sync", text="Đồng bộ")
         self.tree.column("ID", width=100)
         self.tree.column("Title", width=200)
         self.tree.column("Assignee", width=150)
         self.tree.column("Status", width=100)
         self.tree.column("Deadline", width=150)
         self.tree.column("Created At", width=150)
+        self.tree.column("Sync", width=100)
     
         # Cấu hình tag cho Treeview
         self.tree.tag_configure("overdue", background="#FFCDD2", foreground="black")
@@ -301,12 +2224,24 @@ class ProjectManagementApp:
         self.tree.tag_configure("normal", background="white")
         self.tree.tag_configure("even", background="#F5F5F5")
     
-        scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.tree_scrollbar = ttk.Scrollbar(tree_frame, orient=tk.VERTICAL, command=self.tree.yview)
+        self.tree.configure(yscrollcommand=self.tree_scrollbar.set)
+        self.tree_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         self.tree.pack(fill=tk.BOTH, expand=True)
     
+        # Trạng thái vẽ Treeview: các dòng đang hiển thị và cửa sổ của chế độ ảo
+        self.tree_rows = {}
+        self.tree_order = []
+        self.visible_tasks = []
+        self.tree_virtual = False
+        self.tree_offset = 0
+        self.tree_visible_rows = 20
+    
         self.tree.bind("<Double-1>", self.show_task_details)
+        self.tree.bind("<Configure>", self.on_tree_resize)
+        self.tree.bind("<MouseWheel>", self.on_tree_wheel)
+        self.tree.bind("<Button-4>", self.on_tree_wheel)
+        self.tree.bind("<Button-5>", self.on_tree_wheel)
     
         # Frame chứa các nút
         btn_frame = ttk.Frame(main_frame)
@@ -318,7 +2253,9 @@ class ProjectManagementApp:
     
         if self.is_admin:
             ttk.Button(btn_frame, text="Xem lịch sử", command=self.show_history).pack(side=tk.LEFT, padx=5)
+            ttk.Button(btn_frame, text="Thống kê", command=self.show_stats).pack(side=tk.LEFT, padx=5)
             ttk.Button(btn_frame, text="Quản lý người dùng", command=self.create_user_management_screen).pack(side=tk.LEFT, padx=5)
+            ttk.Button(btn_frame, text="Dọn sheet công việc", command=self.compact_task_sheet).pack(side=tk.LEFT, padx=5)
     
         self.load_tasks()
 
@@ -328,13 +2265,13 @@ class ProjectManagementApp:
             return
     
         task_id = self.tree.item(item, "values")[0]
-        task = next((t for t in self.tasks if t["id"] == task_id), None)
+        task = self.tasks.get(task_id)
         if not task:
             messagebox.showerror("Lỗi", "Không tìm thấy công việc")
             return
     
         detail_window = tk.Toplevel(self.root)
-        detail_window.title(f"Chi tiết công việc: {task['title']}")
+        detail_window.title(f"Chi tiết công việc: {task.title}")
         detail_window.geometry("600x705") 
         detail_window.configure(bg='white')
     
@@ -368,18 +2305,18 @@ class ProjectManagementApp:
         ttk.Label(form_frame, text="Ngày sửa cuối").grid(row=11, column=0, padx=5, pady=5, sticky='e')
     
         # Cột 2: Giá trị
-        ttk.Label(form_frame, text=task['id']).grid(row=0, column=1, padx=5, pady=5, sticky='w')
-        ttk.Label(form_frame, text=task['title']).grid(row=1, column=1, padx=5, pady=5, sticky='w')
-        ttk.Label(form_frame, text=task['description']).grid(row=2, column=1, padx=5, pady=5, sticky='w')
-        ttk.Label(form_frame, text=task['assignee']).grid(row=3, column=1, padx=5, pady=5, sticky='w')
-        ttk.Label(form_frame, text=task['project_name']).grid(row=4, column=1, padx=5, pady=5, sticky='w')
-        ttk.Label(form_frame, text=task['status']).grid(row=5, column=1, padx=5, pady=5, sticky='w')
-        ttk.Label(form_frame, text=task['deadline']).grid(row=6, column=1, padx=5, pady=5, sticky='w')
-        ttk.Label(form_frame, text=task['notes'], wraplength=300).grid(row=7, column=1, padx=5, pady=5, sticky='w')
-        ttk.Label(form_frame, text=task['created_at']).grid(row=8, column=1, padx=5, pady=5, sticky='w')
-        ttk.Label(form_frame, text=task['created_by']).grid(row=9, column=1, padx=5, pady=5, sticky='w')
-        ttk.Label(form_frame, text=task['last_modified_by']).grid(row=10, column=1, padx=5, pady=5, sticky='w')
-        ttk.Label(form_frame, text=task['last_modified_at']).grid(row=11, column=1, padx=5, pady=5, sticky='w')
+        ttk.Label(form_frame, text=task.id).grid(row=0, column=1, padx=5, pady=5, sticky='w')
+        ttk.Label(form_frame, text=task.title).grid(row=1, column=1, padx=5, pady=5, sticky='w')
+        ttk.Label(form_frame, text=task.description).grid(row=2, column=1, padx=5, pady=5, sticky='w')
+        ttk.Label(form_frame, text=task.assignee).grid(row=3, column=1, padx=5, pady=5, sticky='w')
+        ttk.Label(form_frame, text=task.project_name).grid(row=4, column=1, padx=5, pady=5, sticky='w')
+        ttk.Label(form_frame, text=task.status).grid(row=5, column=1, padx=5, pady=5, sticky='w')
+        ttk.Label(form_frame, text=format_timestamp(task.deadline)).grid(row=6, column=1, padx=5, pady=5, sticky='w')
+        ttk.Label(form_frame, text=task.notes, wraplength=300).grid(row=7, column=1, padx=5, pady=5, sticky='w')
+        ttk.Label(form_frame, text=format_timestamp(task.created_at)).grid(row=8, column=1, padx=5, pady=5, sticky='w')
+        ttk.Label(form_frame, text=task.created_by).grid(row=9, column=1, padx=5, pady=5, sticky='w')
+        ttk.Label(form_frame, text=task.last_modified_by).grid(row=10, column=1, padx=5, pady=5, sticky='w')
+        ttk.Label(form_frame, text=format_timestamp(task.last_modified_at)).grid(row=11, column=1, padx=5, pady=5, sticky='w')
 
     def create_task_screen(self):
         self.task_window = tk.Toplevel(self.root)
@@ -421,9 +2358,7 @@ class ProjectManagementApp:
         self.assignee_entry = ttk.Entry(form_frame, width=30)
         self.assignee_entry.grid(row=2, column=1, padx=5, pady=5, sticky='w')
 
-        projects = list(set(task["project_name"] for task in self.tasks))
-        if not projects:
-            projects = ["Default Project"]
+        projects = self.tasks.projects() or ["Default Project"]
         self.project_entry = ttk.Entry(form_frame, width=30)
         self.project_entry.insert(0, projects[0])
         self.project_entry.grid(row=3, column=1, padx=5, pady=5, sticky='w')
@@ -463,139 +2398,235 @@ class ProjectManagementApp:
         self.user_tree.pack(fill=tk.BOTH, expand=True)
         
         for username, info in self.users.items():
-            self.user_tree.insert("", tk.END, values=(username, info["full_name"], info["role"]))
+            self.user_tree.insert("", tk.END, values=(username, info.full_name, info.role))
         
         btn_frame = ttk.Frame(main_frame)
         btn_frame.pack(pady=10)
         ttk.Button(btn_frame, text="Xóa người dùng", command=self.delete_user).pack(side=tk.LEFT, padx=5)
-    #Đồng bộ người dùng từ sheet
-    def sync_users_from_sheet(self):
-        try:
-            data = self.login_sheet.get_all_values()
-            if not data or len(data) < 1:
-                headers = ["Username", "Password", "Full Name", "Role"]
-                self.login_sheet.append_row(headers)
-                return
-            
-            self.users = read_json(USERS_FILE, {})
-            temp_users = {}
-            for username, info in list(self.users.items()):
-                try:
-                    decoded_username = decode_data(username)
-                    temp_users[decoded_username] = {
-                        "password": decode_data(info["password"]),
-                        "role": info["role"],
-                        "full_name": decode_data(info["full_name"])
-                    }
-                except:
-                    temp_users[username] = info
-            self.users = temp_users
-            
-            for row in data[1:]:
-                if len(row) >= 4 and row[0].strip():
-                    username, password, full_name, role = row[:4]
-                    if username not in self.users:
-                        self.users[username] = {
-                            "password": password,
-                            "role": role if role in ["user", "admin"] else "user",
-                            "full_name": full_name
-                        }
-                    else:
-                        if (self.users[username]["password"] != password or
-                            self.users[username]["full_name"] != full_name or
-                            self.users[username]["role"] != role):
-                            self.users[username] = {
-                                "password": password,
-                                "role": role if role in ["user", "admin"] else "user",
-                                "full_name": full_name
-                            }
-            
-            write_json(USERS_FILE, self.encode_users_for_json(self.users))
-            self.sync_users_to_login_sheet()
-        except Exception as e:
-            messagebox.showerror("Lỗi", f"Không thể đồng bộ người dùng từ Google Sheet: {e}")
-    #Đồng bộ công việc từ sheet
-    def sync_tasks_from_sheet(self):
-        try:
-            data = self.task_sheet.get_all_values()
-            if not data or len(data) < 1:
-                headers = [
-                    "ID", "Title", "Description", "Assignee", "Project Name",
-                    "Status", "Deadline", "Notes", "Created At",
-                    "Created By", "Last Modified By", "Last Modified At"
-                ]
-                self.task_sheet.append_row(headers)
-                return
-            
-            expected_headers = [
-                "ID", "Title", "Description", "Assignee", "Project Name",
-                "Status", "Deadline", "Notes", "Created At",
-                "Created By", "Last Modified By", "Last Modified At"
-            ]
-            if data[0] != expected_headers:
-                self.task_sheet.clear()
-                self.task_sheet.append_row(expected_headers)
-            
-            self.tasks = read_json(TASKS_FILE, [])
-            for row in data[1:]:
-                if len(row) >= 9 and row[0].strip():
-                    task_id = row[0]
-                    existing_task = next((t for t in self.tasks if t["id"] == task_id), None)
-                    task = {
-                        "id": task_id,
-                        "title": row[1] if len(row) > 1 else "",
-                        "description": row[2] if len(row) > 2 else "",
-                        "assignee": row[3] if len(row) > 3 else "",
-                        "project_name": row[4] if len(row) > 4 else "",
-                        "status": row[5] if len(row) > 5 and row[5] in ["Todo", "In Progress", "Done"] else "Todo",
-                        "deadline": row[6] if len(row) > 6 else "",
-                        "notes": row[7] if len(row) > 7 else "",
-                        "created_at": row[8] if len(row) > 8 else datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                        "created_by": row[9] if len(row) > 9 else "System",
-                        "last_modified_by": row[10] if len(row) > 10 else "System",
-                        "last_modified_at": row[11] if len(row) > 11 else datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    }
-                    
-                    try:
-                        datetime.strptime(task["deadline"], "%Y-%m-%d %H:%M:%S")
-                    except:
-                        task["deadline"] = (datetime.now() + timedelta(days=7)).strftime("%Y-%m-%d %H:%M:%S")
-                    
-                    try:
-                        datetime.strptime(task["created_at"], "%Y-%m-%d %H:%M:%S")
-                    except:
-                        task["created_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    
-                    try:
-                        datetime.strptime(task["last_modified_at"], "%Y-%m-%d %H:%M:%S")
-                    except:
-                        task["last_modified_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    
-                    if existing_task:
-                        if (existing_task["title"] != task["title"] or
-                            existing_task["description"] != task["description"] or
-                            existing_task["assignee"] != task["assignee"] or
-                            existing_task["project_name"] != task["project_name"] or
-                            existing_task["status"] != task["status"] or
-                            existing_task["deadline"] != task["deadline"] or
-                            existing_task["notes"] != task["notes"] or
-                            existing_task["created_by"] != task["created_by"]):
-                            for t in self.tasks:
-                                if t["id"] == task_id:
-                                    t.update(task)
-                                    break
-                    else:
-                        self.tasks.append(task)
-            
-            write_json(TASKS_FILE, self.tasks)
-            for task in self.tasks:
-                cell = self.task_sheet.find(task["id"], in_column=1)
-                if not cell:
-                    self.append_task_to_sheet(task)
+    #Đồng bộ người dùng từ dữ liệu sheet đã tải về
+    def sync_users_from_sheet(self, data):
+        for row in data[1:]:
+            if len(row) >= 4 and row[0].strip():
+                username, password, full_name, role = row[:4]
+                if username not in self.users:
+                    self.users[username] = User(password, full_name, role if role in ["user", "admin"] else "user")
                 else:
-                    self.update_task_in_sheet(task)
-        except Exception as e:
-            messagebox.showerror("Lỗi", f"Không thể đồng bộ công việc từ Google Sheet: {e}")
+                    if (self.users[username].password != password or
+                        self.users[username].full_name != full_name or
+                        self.users[username].role != role):
+                        self.users[username] = User(password, full_name, role if role in ["user", "admin"] else "user")
+        
+        self.storage.save_users(self.users)
+        self.sync_users_to_login_sheet(data)
+    #Đồng bộ toàn bộ sheet Phân công từ dữ liệu đã tải về (sheet sai tiêu đề đã được xóa trắng khi tải)
+    def sync_tasks_full(self, data):
+        if not data or len(data) < 1:
+            self.push_tasks_to_sheet({})
+            self.save_sync_watermark(max((t.last_modified_at for t in self.tasks), default=0))
+            return
+        
+        # Ánh xạ ID -> dữ liệu dòng từ dữ liệu vừa tải về
+        sheet_rows = {}
+        headers_ok = data[0] == TASK_HEADERS
+        if headers_ok:
+            for row in data[1:]:
+                if row and row[0].strip():
+                    sheet_rows[row[0]] = row
+        
+        changed_tasks = []
+        for row in data[1:]:
+            task = Task.from_row(row)
+            # Công việc đang chờ ghi lên sheet thì giữ bản trên máy
+            if not task or task.id in self.pending_writes:
+                continue
+            task_id = task.id
+            existing_task = self.tasks.get(task_id)
+            if existing_task:
+                if (existing_task.title != task.title or
+                    existing_task.description != task.description or
+                    existing_task.assignee != task.assignee or
+                    existing_task.project_name != task.project_name or
+                    existing_task.status != task.status or
+                    existing_task.deadline != task.deadline or
+                    existing_task.notes != task.notes or
+                    existing_task.created_by != task.created_by):
+                    changed_tasks.append(self.tasks.add(task))
+            else:
+                changed_tasks.append(self.tasks.add(task))
+        
+        self.storage.upsert_tasks(changed_tasks)
+        self.push_tasks_to_sheet(sheet_rows)
+        self.save_sync_watermark(max((t.last_modified_at for t in self.tasks), default=0))
+    #Tải các dòng sửa sau mốc và các dòng có ID chưa có trên máy (chạy trên luồng nền). Trả về None nếu tiêu đề sheet không đúng
+    def fetch_task_changes(self, watermark, local_ids):
+        columns = self.task_shards.read_columns()
+        if columns is None:
+            return None
+        
+        # Ánh xạ ID -> Last Modified At trên sheet
+        sheet_modified = {}
+        changed_rows = []
+        for key, row_number, task_id, modified_at in columns:
+            sheet_modified[task_id] = parse_timestamp(modified_at) or 0
+            # Dòng có ID chưa có trên máy luôn được tải, kể cả khi cột L trống hoặc đồng hồ máy ghi chạy chậm
+            if modified_at > watermark or task_id not in local_ids:
+                changed_rows.append((key, row_number))
+        return watermark, sheet_modified, self.task_shards.read_rows(changed_rows)
+    #Thăm dò thay đổi trên sheet (chạy trên luồng nền): một lần đọc hai cột ID và Last Modified At
+    #của các shard (mặc định tất cả), so với dấu vân tay (shard, Last Modified At) từng dòng rồi chỉ tải
+    #các dòng khác. Trả về None nếu tiêu đề sheet không đúng
+    def fetch_remote_changes(self, known, known_from_sheet, keys=None):
+        self.ensure_task_sheet()
+        columns = self.task_shards.read_columns(keys)
+        if columns is None:
+            return None
+        
+        fingerprints = {}
+        changed_rows = []
+        for key, row_number, task_id, modified_at in columns:
+            fingerprints[task_id] = (key, modified_at)
+            if known.get(task_id) != fingerprints[task_id]:
+                changed_rows.append((key, row_number))
+        rows = self.task_shards.read_rows(changed_rows)
+        # Chỉ coi là bị xóa khi lần trước đã thấy trên shard vừa đọc, không phải công việc chỉ có trên máy
+        polled = None if keys is None else set(keys)
+        removed = [task_id for task_id, (key, _) in known.items()
+                   if task_id not in fingerprints and (polled is None or key in polled)] if known_from_sheet else []
+        if polled is not None and removed:
+            # Công việc chuyển sang dự án khác cũng biến mất khỏi shard cũ: tìm trên mọi shard (kể cả shard
+            # máy khác vừa tạo) trước khi coi là bị xóa, rồi tải dòng ở shard mới
+            self.task_shards.refresh()
+            locations, _ = self.task_shards.locate_ids()
+            moved_rows = self.task_shards.read_rows([locations[task_id] for task_id in removed if task_id in locations])
+            for row in moved_rows:
+                if row and row[0] in locations:
+                    fingerprints[row[0]] = (locations[row[0]][0], row[11] if len(row) > 11 else "")
+            rows.extend(moved_rows)
+            removed = [task_id for task_id in removed if task_id not in locations]
+        return fingerprints, rows, removed, polled
+    #Đồng bộ tăng dần: chỉ áp dụng các dòng sửa sau mốc và chỉ đẩy công việc sửa sau mốc
+    def sync_tasks_incremental(self, watermark, sheet_modified, rows):
+        watermark = parse_timestamp(watermark) or 0
+        new_watermark = max([watermark] + [modified_at for modified_at in sheet_modified.values()])
+        
+        # Áp dụng các dòng mới hơn mốc, bên nào sửa sau thì thắng
+        changed_tasks = []
+        for row in rows:
+            task = Task.from_row(row)
+            if not task or task.id in self.pending_writes:
+                continue
+            local_task = self.tasks.get(task.id)
+            if not local_task or task.last_modified_at > local_task.last_modified_at:
+                changed_tasks.append(self.tasks.add(task))
+        self.storage.upsert_tasks(changed_tasks)
+        
+        # Đẩy các công việc sửa cục bộ sau mốc
+        pushed = []
+        for task in self.tasks:
+            if task.last_modified_at <= watermark:
+                continue
+            if task.last_modified_at > sheet_modified.get(task.id, 0):
+                pushed.append(task)
+            new_watermark = max(new_watermark, task.last_modified_at)
+        if pushed:
+            self.queue_task_changes("update", pushed)
+        logging.info(f"Đồng bộ tăng dần: nhận {len(rows)} dòng, gửi {len(pushed)} công việc (Phân công)")
+        
+        self.save_sync_watermark(new_watermark)
+    #Áp dụng kết quả thăm dò: chỉ sửa các công việc và các dòng Treeview có thay đổi
+    def apply_remote_changes(self, result):
+        if result is None:
+            return
+        fingerprints, rows, removed, polled = result
+        if polled is None:
+            self.sheet_row_fingerprints = fingerprints
+        else:
+            # Chỉ đọc một số shard: giữ dấu vân tay của các shard còn lại
+            self.sheet_row_fingerprints = {task_id: fingerprint for task_id, fingerprint in self.sheet_row_fingerprints.items()
+                                           if fingerprint[0] not in polled}
+            self.sheet_row_fingerprints.update(fingerprints)
+        
+        added, changed = [], []
+        moved = False
+        for row in rows:
+            task = Task.from_row(row)
+            # Công việc đang chờ ghi lên sheet thì giữ bản trên máy
+            if not task or task.id in self.pending_writes:
+                continue
+            local_task = self.tasks.get(task.id)
+            if local_task is None:
+                added.append(self.tasks.add(task))
+            elif local_task != task:
+                moved = moved or local_task.assignee != task.assignee or local_task.project_name != task.project_name
+                # Sửa tại chỗ để danh sách đang hiển thị vẫn trỏ đúng công việc
+                changed.append(self.tasks.update(task.id, {field: getattr(task, field) for field in TASK_FIELDS[1:]}))
+        removed = [task_id for task_id in removed if task_id in self.tasks and task_id not in self.pending_writes]
+        removed_tasks = [self.tasks.remove(task_id) for task_id in removed]
+        if not (added or changed or removed):
+            return
+        
+        self.storage.upsert_tasks(added + changed)
+        if removed:
+            self.storage.delete_tasks(removed)
+        logging.info(f"Thăm dò Google Sheet: {len(added)} công việc mới, {len(changed)} công việc đã sửa, {len(removed)} công việc đã xóa (Phân công)")
+        
+        tree = getattr(self, "tree", None)
+        if self.current_user is None or tree is None or not tree.winfo_exists():
+            return
+        if added or removed_tasks or moved:
+            # Tập công việc của bộ lọc hiện tại có thể đã đổi
+            self.refresh_view()
+        else:
+            now = int(datetime.now().timestamp())
+            for task in changed:
+                if task.id in self.tree_rows:
+                    values, tags = self.tree_rows[task.id]
+                    values = self.task_tree_values(task)
+                    tags = (self.deadline_tag(task, now),) + tuple(tags[1:])
+                    tree.item(task.id, values=values, tags=tags)
+                    self.tree_rows[task.id] = (values, tags)
+        self.refresh_project_menu()
+        self.refresh_stats()
+    #Đẩy lên sheet (qua outbox) những công việc khác với dữ liệu đã tải về
+    def push_tasks_to_sheet(self, sheet_rows):
+        pushed = []
+        for task in self.tasks:
+            row = task.to_row()
+            current = sheet_rows.get(task.id)
+            if current is None or (current + [""] * len(row))[:len(row)] != row:
+                pushed.append(task)
+        
+        if pushed:
+            self.queue_task_changes("update", pushed)
+        logging.info(f"Đã xếp hàng {len(pushed)} công việc để ghi lên Google Sheet (Phân công)")
+    #Ghi các dòng theo lô: một lần batch_update cho dòng đã có và một lần append_rows cho dòng mới
+    def write_task_rows(self, sheet, updates, new_rows):
+        if updates:
+            sheet.batch_update([
+                {"range": f"A{row_number}:L{row_number}", "values": [row]}
+                for row_number, row in updates
+            ])
+        if new_rows:
+            sheet.append_rows(new_rows)
+    #Khóa lưu mốc đồng bộ theo từng sheet
+    def sync_watermark_key(self):
+        key = f"{self.config['TASK_SPREADSHEET_ID']}/{self.config['TASK_SHEET_NAME']}"
+        # Đổi cách chia shard thì coi như sheet mới để đồng bộ lại toàn bộ
+        mode = self.config.get("TASK_SHARDING", "")
+        if mode == "hash":
+            return f"{key}#hash{self.config.get('TASK_SHARD_COUNT', TASK_SHARD_COUNT)}"
+        return f"{key}#{mode}" if mode else key
+    #Khóa lưu dấu vân tay của sheet Đăng nhập
+    def login_sheet_key(self):
+        return f"{self.config['LOGIN_SPREADSHEET_ID']}/{self.config['LOGIN_SHEET_NAME']}"
+    #Lưu mốc đồng bộ (high-water mark) của sheet vào config.json
+    def save_sync_watermark(self, timestamp):
+        watermarks = self.config.setdefault("SYNC_WATERMARKS", {})
+        key = self.sync_watermark_key()
+        watermark = format_timestamp(timestamp) if timestamp else ""
+        if watermark and watermark > watermarks.get(key, ""):
+            watermarks[key] = watermark
+            write_json(CONFIG_FILE, self.config, self.report_error)
     #Lưu cấu hình google sheet
     def save_config(self):
         self.config["TASK_SPREADSHEET_ID"] = self.task_spreadsheet_id_entry.get().strip()
@@ -603,164 +2634,265 @@ class ProjectManagementApp:
         self.config["TASK_SHEET_NAME"] = self.task_sheet_name_entry.get().strip() or "Phân công"
         self.config["LOGIN_SHEET_NAME"] = self.login_sheet_name_entry.get().strip() or "Thông tin đăng nhập"
         self.config["CREDENTIALS_FILE"] = self.credentials_file_entry.get().strip() or "taskmanager-credentials.json"
+        self.config["SHEET_BACKEND"] = "local" if self.local_sheet_var.get() else "gspread"
+        self.config["TASK_SHARDING"] = next(mode for mode, label in TASK_SHARDING_LABELS.items() if label == self.sharding_var.get())
         
         if not self.config["TASK_SPREADSHEET_ID"] or not self.config["LOGIN_SPREADSHEET_ID"]:
             messagebox.showerror("Lỗi", "Vui lòng nhập ID Google Sheet cho cả Phân công và Đăng nhập")
             return
         
-        if not os.path.exists(self.config["CREDENTIALS_FILE"]):
+        if self.config["SHEET_BACKEND"] == "gspread" and not os.path.exists(self.config["CREDENTIALS_FILE"]):
             messagebox.showerror("Lỗi", f"Không tìm thấy tệp credentials: {self.config['CREDENTIALS_FILE']}")
             return
         
-        write_json(CONFIG_FILE, self.config)
+        write_json(CONFIG_FILE, self.config, self.report_error)
         self.setup_google_sheets()
-    #Mã hóa thông tin người dùng của json
-    def encode_users_for_json(self, users):
-        encoded_users = {}
-        for username, info in users.items():
-            encoded_username = encode_data(username)
-            encoded_users[encoded_username] = {
-                "password": encode_data(info["password"]),
-                "role": info["role"],
-                "full_name": encode_data(info["full_name"])
-            }
-        return encoded_users
-    #Thêm công việc vào sheet
-    def append_task_to_sheet(self, task):
-        try:
-            if not self.task_sheet.get_all_values():
-                headers = [
-                    "ID", "Title", "Description", "Assignee", "Project Name",
-                    "Status", "Deadline", "Notes", "Created At",
-                    "Created By", "Last Modified By", "Last Modified At"
-                ]
-                self.task_sheet.append_row(headers)
-            
-            row = [
-                task['id'],
-                task['title'],
-                task['description'],
-                task['assignee'],
-                task['project_name'],
-                task['status'],
-                task['deadline'],
-                task['notes'],
-                task['created_at'],
-                task['created_by'],
-                task['last_modified_by'],
-                task['last_modified_at']
-            ]
-            self.task_sheet.append_row(row)
-            print(f"Đã ghi công việc '{task['title']}' lên Google Sheet (Phân công)")
-        except Exception as e:
-            messagebox.showerror("Lỗi", f"Không thể ghi lên Google Sheet (Phân công): {e}")
-    #Thêm người dùng vào sheet
-    def append_user_to_login_sheet(self, username, password, full_name, role):
-        try:
-            row = [username, password, full_name, role]
-            self.login_sheet.append_row(row)
-            print(f"Đã ghi thông tin đăng nhập của '{username}' lên Google Sheet (Đăng nhập)")
-        except Exception as e:
-            messagebox.showerror("Lỗi", f"Không thể ghi thông tin đăng nhập lên Google Sheet: {e}")
-    #Cập nhật thông tin người dùng
-    def update_user_in_login_sheet(self, username, password, full_name, role):
-        try:
-            cell = self.login_sheet.find(username, in_column=1)
-            if cell:
-                row_number = cell.row
-                row = [username, password, full_name, role]
-                self.login_sheet.update(f'A{row_number}:D{row_number}', [row])
-                print(f"Đã cập nhật thông tin đăng nhập của '{username}' trong Google Sheet (Đăng nhập)")
+    #Ghi các dòng người dùng theo lô (chạy trên luồng nền)
+    def write_user_rows(self, updates, new_rows):
+        self.ensure_login_sheet()
+        if updates:
+            self.login_sheet.batch_update([
+                {"range": f"A{row_number}:D{row_number}", "values": [row]}
+                for row_number, row in updates
+            ])
+        if new_rows:
+            self.login_sheet.append_rows(new_rows)
+        logging.info(f"Đã ghi {len(updates)} người dùng cập nhật và {len(new_rows)} dòng mới lên Google Sheet (Đăng nhập)")
+    #Xóa người dùng khỏi google sheet (chạy trên luồng nền)
+    def delete_users_from_login_sheet(self, usernames):
+        self.ensure_login_sheet()
+        names = self.login_sheet.col_values(1)
+        row_numbers = [row_number for row_number, name in enumerate(names, start=1) if row_number > 1 and name in usernames]
+        delete_sheet_rows(self.login_sheet, row_numbers)
+        logging.info(f"Đã xóa thông tin đăng nhập của {len(row_numbers)} người dùng khỏi Google Sheet (Đăng nhập)")
+    #Đồng bộ người dùng lên google sheet: so với dữ liệu đã tải về, chỉ ghi dòng khác hoặc còn thiếu
+    def sync_users_to_login_sheet(self, data):
+        # Ánh xạ tên đăng nhập -> (số dòng, dữ liệu dòng) từ dữ liệu vừa tải về
+        sheet_rows = {}
+        for row_number, row in enumerate(data[1:], start=2):
+            if row and row[0].strip() and row[0] not in sheet_rows:
+                sheet_rows[row[0]] = (row_number, row[:4])
+        
+        updates = []
+        new_rows = [] if data else [USER_HEADERS]
+        for username, info in self.users.items():
+            row = [username, info.password, info.full_name, info.role]
+            if username not in sheet_rows:
+                new_rows.append(row)
+            elif sheet_rows[username][1] != row:
+                updates.append((sheet_rows[username][0], row))
+        
+        if updates or new_rows:
+            self.sync_worker.submit("users", self.write_user_rows, updates, new_rows)
+    #Ghi thay đổi vào outbox rồi nhờ luồng nền đẩy lên sheet, trả về ngay
+    def queue_task_change(self, op, task):
+        self.queue_task_changes(op, [task])
+    #Ghi nhiều thay đổi cùng loại vào outbox, luồng nền gửi chúng trong cùng một lượt
+    def queue_task_changes(self, op, tasks):
+        self.outbox.append_many(op, tasks)
+        for task in tasks:
+            self.pending_writes[task.id] = self.pending_writes.get(task.id, 0) + 1
+            self.sync_state[task.id] = "pending"
+        self.schedule_outbox_flush()
+    #Yêu cầu luồng nền ghi outbox, tránh xếp hàng trùng lặp. Chờ OUTBOX_COALESCE_MS để các thay đổi
+    #liên tiếp được gửi chung một lượt; khi API bị giới hạn, outbox dồn lại và lượt sau gửi được nhiều hơn
+    def schedule_outbox_flush(self):
+        if self.outbox_flush_queued:
+            # Đang ghi dở, ghi tiếp một lượt nữa khi lượt hiện tại xong
+            self.outbox_flush_requested = True
+        elif self.pending_writes:
+            self.outbox_flush_queued = True
+            self.root.after(OUTBOX_COALESCE_MS, self.sync_worker.submit, "outbox", self.flush_outbox)
+    #Hẹn lượt thăm dò sheet Phân công tiếp theo (LIVE_POLL_SECONDS giây, 0 là tắt)
+    def schedule_live_poll(self):
+        seconds = self.config.get("LIVE_POLL_SECONDS", LIVE_POLL_SECONDS)
+        if seconds and not self.live_poll_queued:
+            self.live_poll_queued = True
+            self.root.after(int(seconds * 1000), self.start_live_poll)
+    #Gửi lượt thăm dò cho luồng nền. Lần đầu so với dữ liệu trên máy, các lần sau so với lần thăm dò trước
+    def start_live_poll(self):
+        if self.reconciling:
+            self.live_poll_queued = False
+            self.schedule_live_poll()
+            return
+        if self.sheet_row_fingerprints is None:
+            mode = self.config.get("TASK_SHARDING", "")
+            shard_count = self.config.get("TASK_SHARD_COUNT", TASK_SHARD_COUNT)
+            self.sync_worker.submit("poll", self.fetch_remote_changes, {
+                task.id: (task_shard_key(task, mode, shard_count), format_timestamp(task.last_modified_at))
+                for task in self.tasks
+            }, False)
+        else:
+            self.sync_worker.submit("poll", self.fetch_remote_changes, self.sheet_row_fingerprints, True)
+    #Khi chia sheet theo dự án, lọc theo một dự án chỉ cần đọc lại shard của dự án đó
+    def poll_project_shard(self, project):
+        if (self.config.get("TASK_SHARDING", "") == "project" and self.sheet_row_fingerprints is not None
+                and not self.reconciling):
+            self.sync_worker.submit("shard_poll", self.fetch_remote_changes, self.sheet_row_fingerprints, True, [project])
+    #Ghi toàn bộ outbox lên sheet theo lô (chạy trên luồng nền), trả về ID các thay đổi đã ghi
+    def flush_outbox(self):
+        entries = self.outbox.entries()
+        if not entries:
+            return []
+        self.ensure_task_sheet()
+        
+        # Vị trí (shard, số dòng) hiện tại của các ID, chỉ ghi vào shard sở hữu công việc
+        sheet_rows, filled = self.task_shards.locate_ids()
+        updates = {}
+        new_rows = {}
+        deleted_rows = {}
+        for op, task_id, task in coalesce_outbox(entries):
+            location = sheet_rows.get(task_id)
+            if op == "delete":
+                if location:
+                    deleted_rows.setdefault(location[0], []).append(location[1])
+                continue
+            task = Task.from_dict(task)
+            key = self.task_shards.key_for(task)
+            if location and location[0] == key:
+                updates.setdefault(key, []).append((location[1], task.to_row()))
             else:
-                self.append_user_to_login_sheet(username, password, full_name, role)
-        except Exception as e:
-            messagebox.showerror("Lỗi", f"Không thể cập nhật thông tin đăng nhập trong Google Sheet: {e}")
-    #Xóa người dùng khỏi google sheet
-    def delete_user_from_login_sheet(self, username):
-        try:
-            cell = self.login_sheet.find(username, in_column=1)
-            if cell:
-                row_number = cell.row
-                self.login_sheet.delete_rows(row_number)
-                print(f"Đã xóa thông tin đăng nhập của '{username}' khỏi Google Sheet (Đăng nhập)")
+                # Công việc đổi shard (đổi dự án): xóa ở shard cũ, thêm vào shard mới
+                if location:
+                    deleted_rows.setdefault(location[0], []).append(location[1])
+                new_rows.setdefault(key, []).append(task.to_row())
+        
+        # Cập nhật trước khi xóa để số dòng vẫn đúng, xóa từ dưới lên
+        for key in list(updates) + [key for key in new_rows if key not in updates]:
+            rows = new_rows.get(key, [])
+            if key not in filled:
+                rows = [TASK_HEADERS] + rows
+            self.write_task_rows(self.task_shards.sheet_for(key), updates.get(key, []), rows)
+        for key, row_numbers in deleted_rows.items():
+            delete_sheet_rows(self.task_shards.sheets[key], row_numbers)
+        self.outbox.remove(len(entries))
+        logging.info(f"Đã ghi {len(entries)} thay đổi từ outbox lên Google Sheet (Phân công)")
+        return [entry["task_id"] for entry in entries]
+    #Dọn sheet Phân công: ghi lại toàn bộ công việc trên máy thành các dòng liền nhau
+    def compact_task_sheet(self):
+        if not self.is_admin:
+            messagebox.showerror("Lỗi", "Chỉ quản trị viên mới có thể dọn sheet")
+            return
+        if not messagebox.askyesno("Xác nhận", "Ghi lại toàn bộ sheet Phân công từ dữ liệu trên máy?"):
+            return
+        mode = self.config.get("TASK_SHARDING", "")
+        shard_count = self.config.get("TASK_SHARD_COUNT", TASK_SHARD_COUNT)
+        shard_rows = {} if mode else {"": [TASK_HEADERS]}
+        for task in self.tasks:
+            shard_rows.setdefault(task_shard_key(task, mode, shard_count), [TASK_HEADERS]).append(task.to_row())
+        self.sync_worker.submit("compact", self.rewrite_task_sheet, shard_rows)
+    #Xóa từng shard rồi ghi lại các dòng của nó (chạy trên luồng nền), shard không còn công việc thì chỉ còn
+    #dòng tiêu đề. Outbox không cần xóa vì gửi lại vẫn cho cùng kết quả
+    def rewrite_task_sheet(self, shard_rows):
+        self.ensure_task_sheet()
+        shard_rows = dict(shard_rows)
+        for key in self.task_shards.sheets:
+            shard_rows.setdefault(key, [TASK_HEADERS])
+        for key, rows in shard_rows.items():
+            sheet = self.task_shards.sheet_for(key)
+            sheet.clear()
+            sheet.batch_update([{"range": "A1", "values": rows}])
+        return sum(len(rows) - 1 for rows in shard_rows.values())
+    #Đánh dấu các công việc đã được ghi lên sheet
+    def mark_outbox_flushed(self, task_ids):
+        for task_id in task_ids:
+            if task_id not in self.pending_writes:
+                continue
+            self.pending_writes[task_id] -= 1
+            if self.pending_writes[task_id] <= 0:
+                del self.pending_writes[task_id]
+                self.sync_state[task_id] = "synced"
+            self.refresh_sync_indicator(task_id)
+    #Nhận kết quả từ luồng đồng bộ nền (chạy trên luồng giao diện qua root.after)
+    def poll_sync_results(self):
+        for key, state, result in self.sync_worker.poll():
+            self.handle_sync_result(key, state, result)
+        self.root.after(SYNC_POLL_INTERVAL_MS, self.poll_sync_results)
+    #Xử lý một kết quả từ luồng nền (chạy trên luồng giao diện)
+    def handle_sync_result(self, key, state, result):
+        if key == "reconcile":
+            self.finish_reconcile(state, result)
+            return
+        if key == "reconcile_users":
+            self.apply_users_snapshot(result)
+            return
+        if key == "search_index":
+            if state == "failed":
+                logging.warning(f"Không thể dựng chỉ mục tìm kiếm: {result}")
             else:
-                print(f"Không tìm thấy thông tin đăng nhập của '{username}' trong Google Sheet (Đăng nhập)")
-        except Exception as e:
-            messagebox.showerror("Lỗi", f"Không thể xóa thông tin đăng nhập khỏi Google Sheet: {e}")
-    #Đồng bộ người dùng lên google sheet
-    def sync_users_to_login_sheet(self):
-        try:
-            if not self.login_sheet.get_all_values():
-                headers = ["Username", "Password", "Full Name", "Role"]
-                self.login_sheet.append_row(headers)
-            
-            existing_users = self.login_sheet.col_values(1)[1:]
-            for username, info in self.users.items():
-                if username not in existing_users:
-                    self.append_user_to_login_sheet(
-                        username,
-                        info["password"],
-                        info["full_name"],
-                        info["role"]
-                    )
-                else:
-                    self.update_user_in_login_sheet(
-                        username,
-                        info["password"],
-                        info["full_name"],
-                        info["role"]
-                    )
-        except Exception as e:
-            messagebox.showerror("Lỗi", f"Không thể đồng bộ thông tin người dùng lên Google Sheet (Đăng nhập): {e}")
-    #Cập nhật công việc
-    def update_task_in_sheet(self, task):
-        try:
-            cell = self.task_sheet.find(task['id'], in_column=1)
-            if cell:
-                row_number = cell.row
-                row = [
-                    task['id'],
-                    task['title'],
-                    task['description'],
-                    task['assignee'],
-                    task['project_name'],
-                    task['status'],
-                    task['deadline'],
-                    task['notes'],
-                    task['created_at'],
-                    task['created_by'],
-                    task['last_modified_by'],
-                    task['last_modified_at']
-                ]
-                self.task_sheet.update(f'A{row_number}:L{row_number}', [row])
-                print(f"Đã cập nhật công việc '{task['title']}' trong Google Sheet (Phân công)")
+                store, index = result
+                store.attach_search_index(index)
+            return
+        if key == "startup":
+            if self.reconciling:
+                self.show_startup_step(result)
+            return
+        if key == "users":
+            if state == "failed":
+                # Lần khởi động sau sẽ tải lại sheet Đăng nhập để ghi bù
+                self.config.get("SHEET_FINGERPRINTS", {}).pop(self.login_sheet_key(), None)
+                write_json(CONFIG_FILE, self.config, self.report_error)
+                self.report_error(f"Không thể ghi thông tin người dùng lên Google Sheet (Đăng nhập): {result}")
+            return
+        if key == "poll":
+            self.live_poll_queued = False
+            if state == "failed":
+                logging.warning(f"Không thể thăm dò thay đổi trên Google Sheet (Phân công): {result}")
             else:
-                self.append_task_to_sheet(task)
-        except Exception as e:
-            messagebox.showerror("Lỗi", f"Không thể cập nhật Google Sheet (Phân công): {e}")
-    #Xóa công việc khòi google sheet
-    def delete_task_from_sheet(self, task_id):
-        try:
-            cell = self.task_sheet.find(task_id, in_column=1)
-            if cell:
-                row_number = cell.row
-                self.task_sheet.delete_rows(row_number)
-                print(f"Đã xóa công việc với ID '{task_id}' khỏi Google Sheet (Phân công)")
+                self.apply_remote_changes(result)
+            self.schedule_live_poll()
+            return
+        if key == "shard_poll":
+            if state == "failed":
+                logging.warning(f"Không thể đọc shard của dự án trên Google Sheet (Phân công): {result}")
             else:
-                print(f"Không tìm thấy công việc với ID '{task_id}' trong Google Sheet (Phân công)")
-        except Exception as e:
-            messagebox.showerror("Lỗi", f"Không thể xóa khỏi Google Sheet (Phân công): {e}")
+                self.apply_remote_changes(result)
+            return
+        if key == "compact":
+            if state == "failed":
+                self.report_error(f"Không thể dọn sheet Phân công: {result}")
+            else:
+                logging.info(f"Đã ghi lại {result} công việc liền mạch lên Google Sheet (Phân công)")
+            return
+        if key != "outbox":
+            return
+        self.outbox_flush_queued = False
+        flush_requested = self.outbox_flush_requested
+        self.outbox_flush_requested = False
+        if state == "failed":
+            # Thay đổi vẫn nằm trong outbox, sẽ gửi lại sau
+            logging.warning(f"Không thể đồng bộ outbox lên Google Sheet (Phân công): {result}")
+            for task_id in self.pending_writes:
+                self.sync_state[task_id] = "failed"
+                self.refresh_sync_indicator(task_id)
+            self.root.after(OUTBOX_RETRY_MS, self.schedule_outbox_flush)
+        else:
+            self.mark_outbox_flushed(result)
+            if flush_requested:
+                self.schedule_outbox_flush()
+    #Cập nhật cột Đồng bộ của một dòng trong Treeview
+    def refresh_sync_indicator(self, task_id):
+        tree = getattr(self, "tree", None)
+        if tree is not None and tree.winfo_exists() and tree.exists(task_id):
+            label = SYNC_STATE_LABELS[self.sync_state.get(task_id, "synced")]
+            tree.set(task_id, "Sync", label)
+            values, tags = self.tree_rows[task_id]
+            self.tree_rows[task_id] = (values[:-1] + (label,), tags)
     #Đăng nhập
     def login(self):
         username = self.username_entry.get()
         password = self.password_entry.get()
         
         for stored_username, info in self.users.items():
-            if stored_username == username and info["password"] == password:
+            if stored_username == username and info.password == password:
                 self.current_user = username
-                self.is_admin = info["role"] == "admin"
+                self.is_admin = info.role == "admin"
+                self.load_local_tasks()
                 self.create_main_screen()
                 return
+        if self.loading_users and username not in self.users:
+            messagebox.showerror("Lỗi", "Đang tải danh sách người dùng từ Google Sheets, vui lòng thử lại sau giây lát")
+            return
         messagebox.showerror("Lỗi", "Tên đăng nhập hoặc mật khẩu không đúng")
     #Đăng ký
     def register(self):
@@ -781,65 +2913,209 @@ class ProjectManagementApp:
             messagebox.showerror("Lỗi", "Tên đăng nhập đã tồn tại")
             return
     
-        self.users[username] = {
-            "password": password,
-            "role": role,
-            "full_name": full_name
-        }
-        write_json(USERS_FILE, self.encode_users_for_json(self.users))
-        self.append_user_to_login_sheet(username, password, full_name, role)
+        self.users[username] = User(password, full_name, role)
+        self.storage.save_user(username, self.users[username])
+        self.sync_worker.submit("users", self.write_user_rows, [], [[username, password, full_name, role]])
         messagebox.showinfo("Thành công", "Đăng ký thành công")
         self.create_login_screen()
     
     def load_tasks(self, tasks=None):
-        for item in self.tree.get_children():
-            self.tree.delete(item)
-        
-        tasks = tasks or self.tasks
+        if tasks is None:
+            tasks = self.tasks
         if not self.is_admin and self.view_mode.get() == "mine":
-            current_full_name = self.users[self.current_user]["full_name"]
-            tasks = [task for task in tasks if task["assignee"] == current_full_name]
+            current_full_name = self.users[self.current_user].full_name
+            if tasks is self.tasks:
+                tasks = self.tasks.filter(assignee=current_full_name)
+            else:
+                tasks = [task for task in tasks if task.assignee == current_full_name]
         
-        now = datetime.now()
-        for i, task in enumerate(tasks):
-            deadline = datetime.strptime(task["deadline"], "%Y-%m-%d %H:%M:%S")
-            time_diff = (deadline - now).total_seconds() / 3600
-            
-            tag = "normal"
-            if time_diff <= 0 and task["status"] != "Done":
-                tag = "overdue"
-            elif 0 < time_diff <= 24 and task["status"] != "Done":
-                tag = "near_deadline"
+        self.visible_tasks = list(tasks)
+        threshold = self.config.get("TREE_VIRTUAL_THRESHOLD", 2000)
+        self.set_tree_virtual(bool(threshold) and len(self.visible_tasks) > threshold)
+        self.render_tree()
+    #Vẽ Treeview: toàn bộ danh sách, hoặc chỉ phần đang nhìn thấy khi ở chế độ ảo
+    def render_tree(self):
+        total = len(self.visible_tasks)
+        if self.tree_virtual:
+            self.tree_offset = max(0, min(self.tree_offset, total - self.tree_visible_rows))
+            start = self.tree_offset
+            end = min(total, start + self.tree_visible_rows + VIRTUAL_TREE_BUFFER)
+            if total:
+                self.tree_scrollbar.set(start / total, min(total, start + self.tree_visible_rows) / total)
+        else:
+            start, end = 0, total
+        
+        now = int(datetime.now().timestamp())
+        rows = []
+        for i in range(start, end):
+            task = self.visible_tasks[i]
+            tag = self.deadline_tag(task, now)
             
             if i % 2 == 0:
                 tag = (tag, "even")
             else:
                 tag = (tag,)
             
-            self.tree.insert("", tk.END, values=(
-                task["id"], 
-                task["title"], 
-                task["assignee"],
-                task["status"], 
-                task["deadline"], 
-                task["created_at"]
-            ), tags=tag)
+            rows.append((task.id, self.task_tree_values(task), tag))
+        self.apply_tree_rows(rows)
+        if self.tree_virtual:
+            self.tree.yview_moveto(0)
+    #Giá trị các cột của một công việc trong Treeview
+    def task_tree_values(self, task):
+        return (
+            task.id, 
+            task.title, 
+            task.assignee,
+            task.status, 
+            format_timestamp(task.deadline), 
+            format_timestamp(task.created_at),
+            SYNC_STATE_LABELS[self.sync_state.get(task.id, "synced")]
+        )
+    #Màu theo hạn chót (task.deadline đã là epoch)
+    def deadline_tag(self, task, now):
+        if task.status == "Done":
+            return "normal"
+        if task.deadline <= now:
+            return "overdue"
+        if task.deadline <= now + NEAR_DEADLINE_SECONDS:
+            return "near_deadline"
+        return "normal"
+    #Định kỳ đổi màu các công việc vừa quá hạn hoặc vừa sắp đến hạn kể từ lần kiểm tra trước,
+    #tìm bằng hai lần tìm kiếm nhị phân thay vì duyệt toàn bộ
+    def refresh_deadline_tags(self):
+        now = int(datetime.now().timestamp())
+        tree = getattr(self, "tree", None)
+        if tree is not None and tree.winfo_exists():
+            last = self.deadline_checked_at
+            overdue = self.tasks.deadline_between(last, now)
+            changed = overdue + self.tasks.deadline_between(last + NEAR_DEADLINE_SECONDS, now + NEAR_DEADLINE_SECONDS)
+            if overdue:
+                self.refresh_project_menu({self.tasks.get(task_id).project_name for task_id in overdue})
+            self.refresh_stats()
+            for task_id in changed:
+                if task_id not in self.tree_rows:
+                    continue
+                values, tags = self.tree_rows[task_id]
+                tags = (self.deadline_tag(self.tasks.get(task_id), now),) + tuple(tags[1:])
+                tree.item(task_id, tags=tags)
+                self.tree_rows[task_id] = (values, tags)
+        self.deadline_checked_at = now
+        self.root.after(DEADLINE_REFRESH_MS, self.refresh_deadline_tags)
+    #Chỉ xóa, thêm hoặc sửa những dòng khác với lần vẽ trước
+    def apply_tree_rows(self, rows):
+        wanted = {iid for iid, _, _ in rows}
+        stale = [iid for iid in self.tree_order if iid not in wanted]
+        if stale:
+            self.tree.delete(*stale)
+            for iid in stale:
+                del self.tree_rows[iid]
+        
+        kept = [iid for iid in self.tree_order if iid in wanted]
+        same_order = kept == [iid for iid, _, _ in rows if iid in self.tree_rows]
+        for index, (iid, values, tags) in enumerate(rows):
+            current = self.tree_rows.get(iid)
+            if current is None:
+                self.tree.insert("", index, iid=iid, values=values, tags=tags)
+            else:
+                if current != (values, tags):
+                    self.tree.item(iid, values=values, tags=tags)
+                if not same_order:
+                    self.tree.move(iid, "", index)
+            self.tree_rows[iid] = (values, tags)
+        self.tree_order = [iid for iid, _, _ in rows]
+    #Bật/tắt chế độ ảo: thanh cuộn điều khiển vị trí cửa sổ thay vì cuộn Treeview
+    def set_tree_virtual(self, virtual):
+        if virtual == self.tree_virtual:
+            return
+        self.tree_virtual = virtual
+        self.tree_offset = 0
+        if virtual:
+            self.tree.configure(yscrollcommand="")
+            self.tree_scrollbar.configure(command=self.on_tree_scroll)
+        else:
+            self.tree.configure(yscrollcommand=self.tree_scrollbar.set)
+            self.tree_scrollbar.configure(command=self.tree.yview)
+    #Cuộn ở chế độ ảo
+    def on_tree_scroll(self, action, amount, unit=None):
+        if action == "moveto":
+            self.tree_offset = int(float(amount) * len(self.visible_tasks))
+        elif action == "scroll":
+            step = self.tree_visible_rows if unit == "pages" else 1
+            self.tree_offset += int(amount) * step
+        self.render_tree()
+    #Con lăn chuột ở chế độ ảo (Windows/macOS dùng delta, Linux dùng Button-4/5)
+    def on_tree_wheel(self, event):
+        if not self.tree_virtual:
+            return None
+        direction = -1 if event.num == 4 or event.delta > 0 else 1
+        self.on_tree_scroll("scroll", direction * 3, "units")
+        return "break"
+    #Tính lại số dòng nhìn thấy khi đổi kích thước cửa sổ
+    def on_tree_resize(self, event):
+        visible_rows = max(1, (event.height - TREE_ROW_HEIGHT) // TREE_ROW_HEIGHT)
+        if visible_rows != self.tree_visible_rows:
+            self.tree_visible_rows = visible_rows
+            if self.tree_virtual:
+                self.render_tree()
+    #Nhãn của dự án trong menu: số công việc theo trạng thái và số công việc quá hạn
+    def project_label(self, project, overdue):
+        counts = self.tasks.status_counts("project_name", project)
+        return (f"{project} (Todo: {counts['Todo']}, In Progress: {counts['In Progress']}, "
+                f"Done: {counts['Done']}, quá hạn: {overdue[project]})")
+    #Cập nhật menu dự án từ sổ dự án: chỉ dựng lại menu khi tập dự án thay đổi,
+    #còn lại chỉ sửa nhãn của các dự án được truyền vào (None là tất cả)
+    def refresh_project_menu(self, projects=None):
+        menu = self.project_menu['menu']
+        names = self.tasks.projects()
+        overdue = self.tasks.overdue_by("project_name", int(datetime.now().timestamp()))
+        if names != self.project_menu_names:
+            self.project_menu_names = names
+            menu.delete(0, 'end')
+            menu.add_command(label="Tất cả", command=lambda: self.select_project("Tất cả"))
+            for project in names:
+                menu.add_command(label=self.project_label(project, overdue), command=lambda p=project: self.select_project(p))
+            return
+        for project in set(names if projects is None else projects):
+            position = bisect.bisect_left(names, project)
+            if position < len(names) and names[position] == project:
+                menu.entryconfigure(position + 1, label=self.project_label(project, overdue))
+    #Chọn dự án trong menu rồi lọc
+    def select_project(self, project):
+        self.project_var.set(project)
+        self.filter_tasks_by_project()
     #Lọc công việc bằng project
     def filter_tasks_by_project(self, *args):
         project = self.project_var.get()
         if project == "Tất cả":
             filtered_tasks = self.tasks
         else:
-            filtered_tasks = [task for task in self.tasks if task["project_name"] == project]
-        self.load_tasks(filtered_tasks)
-    #Tìm kiếm công việc
-    def search_tasks(self):
-        query = self.search_entry.get().lower()
-        filtered_tasks = [
-            task for task in self.tasks
-            if query in task["title"].lower() or query in task["assignee"].lower()
-        ]
+            filtered_tasks = self.tasks.filter(project_name=project)
+            self.poll_project_shard(project)
         self.load_tasks(filtered_tasks)
+    #Vẽ lại theo bộ lọc đang dùng: từ khóa tìm kiếm nếu có, nếu không thì theo dự án
+    def refresh_view(self):
+        if self.search_entry.get().strip():
+            self.search_tasks()
+        else:
+            self.filter_tasks_by_project()
+    #Tìm kiếm công việc; typing là lượt tìm tự động khi đang gõ, còn lại là bấm Tìm/Enter
+    def search_tasks(self, typing=False):
+        if self.search_after_id is not None and not typing:
+            self.root.after_cancel(self.search_after_id)
+        self.search_after_id = None
+        task_ids = self.tasks.search(self.search_entry.get(), SEARCH_RESULT_LIMIT, typing)
+        if task_ids is None:
+            self.load_tasks()
+        else:
+            self.load_tasks([self.tasks.get(task_id) for task_id in task_ids])
+    #Tìm ngay khi gõ, chờ người dùng ngừng gõ một chút rồi mới tìm
+    def on_search_typed(self, event):
+        # Nhả phím Enter không phải gõ thêm: lượt tìm đầy đủ đã chạy khi nhấn
+        if event.keysym == "Return":
+            return
+        if self.search_after_id is not None:
+            self.root.after_cancel(self.search_after_id)
+        self.search_after_id = self.root.after(SEARCH_DEBOUNCE_MS, self.search_tasks, True)
 
 
     def save_task(self):
@@ -855,43 +3131,41 @@ class ProjectManagementApp:
             messagebox.showerror("Lỗi", "Vui lòng nhập đầy đủ thông tin", parent=self.task_window)
             return
 
-        full_names = [info["full_name"] for info in self.users.values()]
+        full_names = [info.full_name for info in self.users.values()]
         if assignee not in full_names:
             messagebox.showerror("Lỗi", f"Người phụ trách '{assignee}' không tồn tại", parent=self.task_window)
             return
 
-        try:
-            datetime.strptime(deadline, "%Y-%m-%d %H:%M:%S")
-        except:
+        deadline = parse_timestamp(deadline)
+        if deadline is None:
             messagebox.showerror("Lỗi", "Hạn chót không đúng định dạng (YYYY-MM-DD HH:MM:SS)", parent=self.task_window)
             return
 
-        task = {
-            "id": str(uuid.uuid4()),
-            "title": title,
-            "description": description,
-            "assignee": assignee,
-            "project_name": project_name,
-            "status": status,
-            "deadline": deadline,
-            "notes": notes,
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "created_by": self.current_user,
-            "last_modified_by": self.current_user,
-            "last_modified_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        }
+        now = int(datetime.now().timestamp())
+        task = Task(
+            str(uuid.uuid4()),
+            title,
+            description,
+            assignee,
+            project_name,
+            status,
+            deadline,
+            notes,
+            now,
+            self.current_user,
+            self.current_user,
+            now
+        )
 
-        self.tasks.append(task)
+        self.tasks.add(task)
         self.log_history("Created", task)
-        write_json(TASKS_FILE, self.tasks)
+        self.storage.upsert_tasks([task])
 
-        self.append_task_to_sheet(task)
+        self.queue_task_change("append", task)
 
         self.load_tasks()
-        self.project_menu['menu'].delete(0, 'end')
-        projects = ["Tất cả"] + list(set(task["project_name"] for task in self.tasks))
-        for project in projects:
-            self.project_menu['menu'].add_command(label=project, command=lambda p=project: self.project_var.set(p))
+        self.refresh_project_menu([task.project_name])
+        self.refresh_stats()
 
         messagebox.showinfo("Thành công", "Công việc đã được thêm", parent=self.task_window)
         self.task_window.destroy()
@@ -903,15 +3177,15 @@ class ProjectManagementApp:
             messagebox.showerror("Lỗi", "Vui lòng chọn một công việc")
             return
 
-        task_id = self.tree.item(selected)["values"][0]
-        task = next((t for t in self.tasks if t["id"] == task_id), None)
+        task_id = self.tree.item(selected[0])["values"][0]
+        task = self.tasks.get(task_id)
         if not task:
             messagebox.showerror("Lỗi", "Không tìm thấy công việc")
             return
 
-        current_full_name = self.users[self.current_user]["full_name"]
-        can_edit_full = self.is_admin or task["created_by"] == self.current_user
-        can_edit_status = task["assignee"] == current_full_name
+        current_full_name = self.users[self.current_user].full_name
+        can_edit_full = self.is_admin or task.created_by == self.current_user
+        can_edit_status = task.assignee == current_full_name
 
         if not (can_edit_full or can_edit_status):
             messagebox.showerror("Lỗi", "Bạn không có quyền chỉnh sửa công việc này")
@@ -950,30 +3224,30 @@ class ProjectManagementApp:
 
             # Cột 2: Trường nhập liệu
             self.title_entry = ttk.Entry(form_frame, width=30)
-            self.title_entry.insert(0, task["title"])
+            self.title_entry.insert(0, task.title)
             self.title_entry.grid(row=0, column=1, padx=5, pady=5, sticky='w')
 
             self.desc_entry = Text(form_frame, height=5, width=30, font=('Roboto', 11))  # Đổi từ Entry sang Text
-            self.desc_entry.insert(tk.END, task["description"])
+            self.desc_entry.insert(tk.END, task.description)
             self.desc_entry.grid(row=1, column=1, padx=5, pady=5, sticky='w')
 
             self.assignee_entry = ttk.Entry(form_frame, width=30)
-            self.assignee_entry.insert(0, task["assignee"])
+            self.assignee_entry.insert(0, task.assignee)
             self.assignee_entry.grid(row=2, column=1, padx=5, pady=5, sticky='w')
 
             self.project_entry = ttk.Entry(form_frame, width=30)
-            self.project_entry.insert(0, task["project_name"])
+            self.project_entry.insert(0, task.project_name)
             self.project_entry.grid(row=3, column=1, padx=5, pady=5, sticky='w')
 
-            self.status_var = tk.StringVar(value=task["status"])
-            ttk.OptionMenu(form_frame, self.status_var, task["status"], "Todo", "In Progress", "Done").grid(row=4, column=1, padx=5, pady=5, sticky='w')
+            self.status_var = tk.StringVar(value=task.status)
+            ttk.OptionMenu(form_frame, self.status_var, task.status, "Todo", "In Progress", "Done").grid(row=4, column=1, padx=5, pady=5, sticky='w')
 
             self.deadline_entry = ttk.Entry(form_frame, width=30)
-            self.deadline_entry.insert(0, task["deadline"])
+            self.deadline_entry.insert(0, format_timestamp(task.deadline))
             self.deadline_entry.grid(row=5, column=1, padx=5, pady=5, sticky='w')
 
             self.notes_entry = Text(form_frame, height=5, width=30, font=('Roboto', 11))
-            self.notes_entry.insert(tk.END, task["notes"])
+            self.notes_entry.insert(tk.END, task.notes)
             self.notes_entry.grid(row=6, column=1, padx=5, pady=5, sticky='w')
         else:
             self.task_window.geometry("600x300")
@@ -984,10 +3258,10 @@ class ProjectManagementApp:
             ttk.Label(form_frame, text="Trạng thái").grid(row=2, column=0, padx=5, pady=5, sticky='e')
 
             # Cột 2: Trường nhập liệu
-            ttk.Label(form_frame, text=f"{task['title']} (Không thể chỉnh sửa)", state="disabled").grid(row=0, column=1, padx=5, pady=5, sticky='w')
-            ttk.Label(form_frame, text=f"{task['assignee']} (Không thể chỉnh sửa)", state="disabled").grid(row=1, column=1, padx=5, pady=5, sticky='w')
-            self.status_var = tk.StringVar(value=task["status"])
-            ttk.OptionMenu(form_frame, self.status_var, task["status"], "Todo", "In Progress", "Done").grid(row=2, column=1, padx=5, pady=5, sticky='w')
+            ttk.Label(form_frame, text=f"{task.title} (Không thể chỉnh sửa)", state="disabled").grid(row=0, column=1, padx=5, pady=5, sticky='w')
+            ttk.Label(form_frame, text=f"{task.assignee} (Không thể chỉnh sửa)", state="disabled").grid(row=1, column=1, padx=5, pady=5, sticky='w')
+            self.status_var = tk.StringVar(value=task.status)
+            ttk.OptionMenu(form_frame, self.status_var, task.status, "Todo", "In Progress", "Done").grid(row=2, column=1, padx=5, pady=5, sticky='w')
 
             # Khởi tạo các trường ẩn để tránh lỗi
             self.title_entry = ttk.Entry(form_frame, state="disabled")
@@ -998,14 +3272,14 @@ class ProjectManagementApp:
             self.notes_entry = Text(form_frame, height=5, width=30, state="disabled")
     
     def update_task(self, task_id):
-        task = next((t for t in self.tasks if t["id"] == task_id), None)
+        task = self.tasks.get(task_id)
         if not task:
             messagebox.showerror("Lỗi", "Không tìm thấy công việc", parent=self.task_window)
             return
 
-        current_full_name = self.users[self.current_user]["full_name"]
-        can_edit_full = self.is_admin or task["created_by"] == self.current_user
-        can_edit_status = task["assignee"] == current_full_name
+        current_full_name = self.users[self.current_user].full_name
+        can_edit_full = self.is_admin or task.created_by == self.current_user
+        can_edit_status = task.assignee == current_full_name
 
         if not (can_edit_full or can_edit_status):
             messagebox.showerror("Lỗi", "Bạn không có quyền chỉnh sửa công việc này", parent=self.task_window)
@@ -1024,47 +3298,44 @@ class ProjectManagementApp:
                 messagebox.showerror("Lỗi", "Vui lòng nhập đầy đủ thông tin", parent=self.task_window)
                 return
 
-            full_names = [info["full_name"] for info in self.users.values()]
+            full_names = [info.full_name for info in self.users.values()]
             if assignee not in full_names:
                 messagebox.showerror("Lỗi", f"Người phụ trách '{assignee}' không tồn tại", parent=self.task_window)
                 return
 
-            try:
-                datetime.strptime(deadline, "%Y-%m-%d %H:%M:%S")
-            except:
+            deadline = parse_timestamp(deadline)
+            if deadline is None:
                 messagebox.showerror("Lỗi", "Hạn chót không đúng định dạng (YYYY-MM-DD HH:MM:SS)", parent=self.task_window)
                 return
         else:
             status = self.status_var.get()
-            title = task["title"]
-            description = task["description"]
-            assignee = task["assignee"]
-            project_name = task["project_name"]
-            deadline = task["deadline"]
-            notes = task["notes"]
+            title = task.title
+            description = task.description
+            assignee = task.assignee
+            project_name = task.project_name
+            deadline = task.deadline
+            notes = task.notes
+
+        previous_project = task.project_name
+        task = self.tasks.update(task_id, {
+            "title": title,
+            "description": description,
+            "assignee": assignee,
+            "project_name": project_name,
+            "status": status,
+            "deadline": deadline,
+            "notes": notes,
+            "last_modified_by": self.current_user,
+            "last_modified_at": int(datetime.now().timestamp())
+        })
+        self.log_history("Updated", task)
 
-        for task in self.tasks:
-            if task["id"] == task_id:
-                task["title"] = title
-                task["description"] = description
-                task["assignee"] = assignee
-                task["project_name"] = project_name
-                task["status"] = status
-                task["deadline"] = deadline
-                task["notes"] = notes
-                task["last_modified_by"] = self.current_user
-                task["last_modified_at"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                self.log_history("Updated", task)
-
-                self.update_task_in_sheet(task)
-                break
+        self.queue_task_change("update", task)
 
-        write_json(TASKS_FILE, self.tasks)
+        self.storage.upsert_tasks([task])
         self.load_tasks()
-        self.project_menu['menu'].delete(0, 'end')
-        projects = ["Tất cả"] + list(set(task["project_name"] for task in self.tasks))
-        for project in projects:
-            self.project_menu['menu'].add_command(label=project, command=lambda p=project: self.project_var.set(p))
+        self.refresh_project_menu([previous_project, task.project_name])
+        self.refresh_stats()
 
         messagebox.showinfo("Thành công", "Công việc đã được cập nhật", parent=self.task_window)
         self.task_window.destroy()
@@ -1075,46 +3346,48 @@ class ProjectManagementApp:
             messagebox.showerror("Lỗi", "Vui lòng chọn một công việc")
             return
     
-        task_id = self.tree.item(selected)["values"][0]
-        task = next((t for t in self.tasks if t["id"] == task_id), None)
-        if not task:
+        # Dòng trong Treeview dùng ID công việc làm iid
+        tasks = [self.tasks.get(task_id) for task_id in selected]
+        if not all(tasks):
             messagebox.showerror("Lỗi", "Không tìm thấy công việc")
             return
     
         # Kiểm tra quyền xóa: chỉ admin hoặc người tạo công việc được xóa
-        if not (self.is_admin or task["created_by"] == self.current_user):
+        if not all(self.is_admin or task.created_by == self.current_user for task in tasks):
             messagebox.showerror("Lỗi", "Bạn không có quyền xóa công việc này")
             return
     
-        task_title = self.tree.item(selected)["values"][1]
-        confirm = messagebox.askyesno("Xác nhận", f"Bạn có chắc muốn xóa công việc '{task_title}'?")
+        if len(tasks) == 1:
+            confirm = messagebox.askyesno("Xác nhận", f"Bạn có chắc muốn xóa công việc '{tasks[0].title}'?")
+        else:
+            confirm = messagebox.askyesno("Xác nhận", f"Bạn có chắc muốn xóa {len(tasks)} công việc đã chọn?")
         if not confirm:
             return
     
-        self.log_history("Deleted", task)
-        self.tasks = [task for task in self.tasks if task["id"] != task_id]
-        write_json(TASKS_FILE, self.tasks)
-    
-        self.delete_task_from_sheet(task_id)
+        for task in tasks:
+            self.log_history("Deleted", task)
+            self.tasks.remove(task.id)
+        self.storage.delete_tasks([task.id for task in tasks])
+        self.queue_task_changes("delete", tasks)
     
         self.load_tasks()
+        self.refresh_project_menu({task.project_name for task in tasks})
+        self.refresh_stats()
         messagebox.showinfo("Thành công", "Công việc đã được xóa")
-        self.project_menu['menu'].delete(0, 'end')
-        projects = ["Tất cả"] + list(set(task["project_name"] for task in self.tasks))
-        for project in projects:
-            self.project_menu['menu'].add_command(label=project, command=lambda p=project: self.project_var.set(p))
 
 
     def log_history(self, action, task):
         history_entry = {
             "action": action,
-            "task_id": task["id"],
-            "title": task["title"],
+            "task_id": task.id,
+            "title": task.title,
             "user": self.current_user,
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "status": task.status
         }
-        self.history.append(history_entry)
-        write_json(HISTORY_FILE, self.history)
+        self.storage.append_history(history_entry)
+        if self.completions is not None:
+            self.completions.record(history_entry)
 
     def show_history(self):
         if not self.is_admin:
@@ -1131,22 +3404,155 @@ class ProjectManagementApp:
         
         ttk.Label(main_frame, text="Lịch sử Thay đổi", font=('Roboto', 16, 'bold'), foreground='#4CAF50').pack(pady=10)
         
-        tree = ttk.Treeview(main_frame, columns=("Action", "Task ID", "Title", "User", "Timestamp"), show="headings")
-        tree.heading("Action", text="Hành động")
-        tree.heading("Task ID", text="ID Công việc")
-        tree.heading("Title", text="Tiêu đề")
-        tree.heading("User", text="Người dùng")
-        tree.heading("Timestamp", text="Thời gian")
-        tree.pack(fill=tk.BOTH, expand=True)
+        # Frame lọc lịch sử
+        filter_frame = ttk.Frame(main_frame)
+        filter_frame.pack(fill=tk.X, pady=5)
+        ttk.Label(filter_frame, text="Người dùng").pack(side=tk.LEFT, padx=5)
+        self.history_user_entry = ttk.Entry(filter_frame, width=15)
+        self.history_user_entry.pack(side=tk.LEFT, padx=5)
+        ttk.Label(filter_frame, text="ID Công việc").pack(side=tk.LEFT, padx=5)
+        self.history_task_id_entry = ttk.Entry(filter_frame, width=15)
+        self.history_task_id_entry.pack(side=tk.LEFT, padx=5)
+        ttk.Label(filter_frame, text="Hành động").pack(side=tk.LEFT, padx=5)
+        self.history_action_var = tk.StringVar(value="Tất cả")
+        ttk.OptionMenu(filter_frame, self.history_action_var, "Tất cả", "Tất cả", *HISTORY_ACTIONS).pack(side=tk.LEFT, padx=5)
+        ttk.Button(filter_frame, text="Lọc", command=self.filter_history).pack(side=tk.LEFT, padx=5)
+        
+        self.history_tree = ttk.Treeview(main_frame, columns=("Action", "Task ID", "Title", "User", "Timestamp"), show="headings")
+        self.history_tree.heading("Action", text="Hành động")
+        self.history_tree.heading("Task ID", text="ID Công việc")
+        self.history_tree.heading("Title", text="Tiêu đề")
+        self.history_tree.heading("User", text="Người dùng")
+        self.history_tree.heading("Timestamp", text="Thời gian")
+        self.history_tree.pack(fill=tk.BOTH, expand=True)
+        
+        bottom_frame = ttk.Frame(main_frame)
+        bottom_frame.pack(fill=tk.X, pady=5)
+        self.history_more_button = ttk.Button(bottom_frame, text="Tải thêm", command=self.load_history_page)
+        self.history_more_button.pack(side=tk.LEFT, padx=5)
+        self.history_count_label = ttk.Label(bottom_frame, text="")
+        self.history_count_label.pack(side=tk.LEFT, padx=5)
         
-        for entry in self.history:
-            tree.insert("", tk.END, values=(
+        self.filter_history()
+
+    # Áp dụng bộ lọc và hiển thị lại từ trang đầu (mới nhất)
+    def filter_history(self):
+        action = self.history_action_var.get()
+        self.history_entries = self.storage.iter_history(
+            user=self.history_user_entry.get().strip(),
+            task_id=self.history_task_id_entry.get().strip(),
+            action="" if action == "Tất cả" else action
+        )
+        self.history_tree.delete(*self.history_tree.get_children())
+        self.load_history_page()
+
+    # Đọc thêm một trang lịch sử, không tải toàn bộ nhật ký
+    def load_history_page(self):
+        count = 0
+        for entry in self.history_entries:
+            self.history_tree.insert("", tk.END, values=(
                 entry["action"],
                 entry["task_id"],
                 entry["title"],
                 entry["user"],
                 entry["timestamp"]
             ))
+            count += 1
+            if count == HISTORY_PAGE_SIZE:
+                break
+        if count < HISTORY_PAGE_SIZE:
+            self.history_more_button.state(["disabled"])
+        else:
+            self.history_more_button.state(["!disabled"])
+        self.history_count_label.config(text=f"Đang hiển thị {len(self.history_tree.get_children())} mục")
+
+    # Cập nhật dòng thống kê nhanh từ các bộ đếm của TaskStore, không duyệt công việc
+    def refresh_stats(self):
+        stats_label = getattr(self, "stats_label", None)
+        if stats_label is None or not stats_label.winfo_exists():
+            return
+        now = int(datetime.now().timestamp())
+        stats_label.config(text=(
+            f"Tổng: {len(self.tasks)}  |  Todo: {self.tasks.count('status', 'Todo')}  |  "
+            f"In Progress: {self.tasks.count('status', 'In Progress')}  |  Done: {self.tasks.count('status', 'Done')}  |  "
+            f"Quá hạn: {self.tasks.overdue_count(now)}  |  Sắp đến hạn: {self.tasks.near_deadline_count(now)}"
+        ))
+
+    def show_stats(self):
+        if not self.is_admin:
+            messagebox.showerror("Lỗi", "Chỉ quản trị viên mới có thể xem thống kê")
+            return
+        
+        # Đọc lịch sử một lần, sau đó log_history cập nhật dần
+        if self.completions is None:
+            self.completions = CompletionCounter()
+            self.completions.load(self.storage.iter_history())
+        
+        stats_window = tk.Toplevel(self.root)
+        stats_window.title("Thống kê")
+        stats_window.geometry("900x500")
+        stats_window.configure(bg='white')
+        
+        main_frame = ttk.Frame(stats_window, padding=20)
+        main_frame.pack(fill=tk.BOTH, expand=True)
+        
+        ttk.Label(main_frame, text="Thống kê Công việc", font=('Roboto', 16, 'bold'), foreground='#4CAF50').pack(pady=10)
+        
+        notebook = ttk.Notebook(main_frame)
+        notebook.pack(fill=tk.BOTH, expand=True)
+        self.stats_trees = {}
+        for field, title in (("assignee", "Theo người phụ trách"), ("project_name", "Theo dự án")):
+            tree = ttk.Treeview(notebook, columns=("Name", "Total", "Todo", "In Progress", "Done", "Overdue"), show="headings")
+            tree.heading("Name", text="Người phụ trách" if field == "assignee" else "Dự án")
+            tree.heading("Total", text="Tổng")
+            tree.heading("Todo", text="Todo")
+            tree.heading("In Progress", text="In Progress")
+            tree.heading("Done", text="Done")
+            tree.heading("Overdue", text="Quá hạn")
+            tree.column("Name", width=250)
+            for column in ("Total", "Todo", "In Progress", "Done", "Overdue"):
+                tree.column(column, width=100, anchor="e")
+            notebook.add(tree, text=title)
+            self.stats_trees[field] = tree
+        
+        self.throughput_tree = ttk.Treeview(notebook, columns=("Week", "Done"), show="headings")
+        self.throughput_tree.heading("Week", text="Tuần (từ thứ Hai)")
+        self.throughput_tree.heading("Done", text="Số công việc hoàn thành")
+        notebook.add(self.throughput_tree, text="Hoàn thành theo tuần")
+        
+        self.api_stats_label = ttk.Label(main_frame, text="")
+        self.api_stats_label.pack(pady=5)
+        ttk.Button(main_frame, text="Làm mới", command=self.fill_stats).pack(pady=5)
+        self.fill_stats()
+
+    # Điền các bảng thống kê từ bộ đếm của TaskStore và CompletionCounter
+    def fill_stats(self):
+        now = int(datetime.now().timestamp())
+        for field, tree in self.stats_trees.items():
+            overdue = self.tasks.overdue_by(field, now)
+            tree.delete(*tree.get_children())
+            for value in self.tasks.groups(field):
+                counts = self.tasks.status_counts(field, value)
+                tree.insert("", tk.END, values=(
+                    value,
+                    sum(counts.values()),
+                    counts["Todo"],
+                    counts["In Progress"],
+                    counts["Done"],
+                    overdue[value]
+                ))
+        self.throughput_tree.delete(*self.throughput_tree.get_children())
+        for week in sorted(self.completions.weeks, reverse=True):
+            self.throughput_tree.insert("", tk.END, values=(week, self.completions.weeks[week]))
+        
+        # Độ trễ gọi Google Sheets API từ lúc mở ứng dụng (chưa kết nối thì chưa có)
+        sheet_backend = getattr(self, "sheet_backend", None)
+        if sheet_backend is not None:
+            api = sheet_backend.stats.summary()
+            self.api_stats_label.config(text=(
+                f"Google Sheets API: {api['count']} lượt gọi  |  Trung bình: {api['mean_ms']} ms  |  "
+                f"p50: {api['p50_ms']} ms  |  p95: {api['p95_ms']} ms  |  Lâu nhất: {api['max_ms']} ms"
+            ))
 
     def delete_user(self):
         selected = self.user_tree.selection()
@@ -1154,14 +3560,17 @@ class ProjectManagementApp:
             messagebox.showerror("Lỗi", "Vui lòng chọn một người dùng")
             return
         
-        username = self.user_tree.item(selected)["values"][0]
-        if username == self.current_user:
+        usernames = [str(self.user_tree.item(item)["values"][0]) for item in selected]
+        if self.current_user in usernames:
             messagebox.showerror("Lỗi", "Không thể xóa tài khoản đang đăng nhập")
             return
+        if len(usernames) > 1 and not messagebox.askyesno("Xác nhận", f"Bạn có chắc muốn xóa {len(usernames)} người dùng đã chọn?"):
+            return
         
-        self.delete_user_from_login_sheet(username)
-        del self.users[username]
-        write_json(USERS_FILE, self.encode_users_for_json(self.users))
+        self.sync_worker.submit("users", self.delete_users_from_login_sheet, usernames)
+        for username in usernames:
+            del self.users[username]
+        self.storage.delete_users(usernames)
         self.user_window.destroy()
         self.create_user_management_screen()
 
@@ -1169,7 +3578,215 @@ class ProjectManagementApp:
         for widget in self.root.winfo_children():
             widget.destroy()
 
+# Đồng bộ và thao tác hàng loạt không cần Tk (cron, máy chủ không có màn hình). Dùng lại logic
+# đồng bộ của ProjectManagementApp; lỗi được ghi log và trả về qua mã thoát thay cho hộp thoại
+class HeadlessApp(ProjectManagementApp):
+    def __init__(self):
+        self.root = HeadlessRoot()
+        self.current_user = None
+        self.is_admin = False
+        self.errors = []
+        self.init_sync_state(InlineSyncWorker())
+        self.load_local_data()
+
+    #Nạp lại người dùng, công việc và outbox từ máy (giao diện có thể đã sửa giữa hai lượt đồng bộ)
+    def load_local_data(self):
+        self.users = self.storage.load_users()
+        self.tasks = TaskStore(self.storage.load_tasks())
+        self.load_pending_writes()
+
+    def report_error(self, message):
+        logging.error(message)
+        self.errors.append(message)
+
+    #Không có màn hình cấu hình khi chạy dòng lệnh, lỗi kết nối đã được ghi log
+    def create_config_screen(self):
+        pass
+
+    #Xử lý hết kết quả của các thao tác nền, kể cả thao tác do chính các kết quả đó sinh ra
+    def run_pending(self):
+        while True:
+            results = self.sync_worker.poll()
+            if not results:
+                return
+            for key, state, result in results:
+                self.handle_sync_result(key, state, result)
+
+    #Một lượt đối chiếu với sheet như khi mở ứng dụng, rồi gửi nốt outbox. Trả về True nếu không có lỗi
+    def sync(self):
+        self.errors = []
+        # Mỗi lượt tự thử lại nên lỗi kết nối luôn được ghi nhận
+        self.reconcile_retry_ms = RECONCILE_RETRY_MS
+        self.reconciling = True
+        self.loading_users = True
+        self.start_reconcile()
+        self.run_pending()
+        if self.pending_writes and not self.errors:
+            self.outbox_flush_queued = self.outbox_flush_requested = False
+            self.sync_worker.submit("outbox", self.flush_outbox)
+            self.run_pending()
+        if self.pending_writes:
+            self.report_error(f"Còn {len(self.pending_writes)} công việc chưa ghi được lên Google Sheet (Phân công)")
+        return not self.errors
+
+    #Chạy liên tục: mỗi interval giây nạp lại dữ liệu trên máy và đối chiếu một lượt, dừng khi stop được đặt
+    def run_daemon(self, interval, stop):
+        logging.info(f"Bắt đầu đồng bộ định kỳ mỗi {interval:g} giây")
+        while True:
+            self.load_local_data()
+            if self.sync():
+                logging.info(f"Đồng bộ xong: {len(self.tasks)} công việc, {len(self.users)} người dùng")
+            if stop.wait(interval):
+                logging.info("Dừng đồng bộ định kỳ")
+                return
+
+    #Nhập công việc vào dữ liệu trên máy và outbox, công việc chưa có ID được tạo mới.
+    #Trả về (số công việc mới, số công việc cập nhật)
+    def import_tasks(self, records, user):
+        self.current_user = user
+        now = format_timestamp(int(datetime.now().timestamp()))
+        full_names = {info.full_name for info in self.users.values()}
+        imported = []
+        created = 0
+        for number, record in enumerate(records, start=1):
+            record = {field: str(record.get(field) or "").strip() for field in TASK_FIELDS}
+            if not record["title"]:
+                self.report_error(f"Công việc thứ {number} không có tiêu đề, bỏ qua")
+                continue
+            if full_names and record["assignee"] not in full_names:
+                logging.warning(f"Công việc thứ {number}: người phụ trách '{record['assignee']}' không tồn tại")
+            existing = self.tasks.get(record["id"]) if record["id"] else None
+            record["id"] = record["id"] or str(uuid.uuid4())
+            record["created_at"] = record["created_at"] or (format_timestamp(existing.created_at) if existing else now)
+            record["created_by"] = record["created_by"] or (existing.created_by if existing else user)
+            record["last_modified_by"] = user
+            record["last_modified_at"] = now
+            task = self.tasks.add(Task.from_dict(record))
+            self.log_history("Updated" if existing else "Created", task)
+            imported.append(task)
+            created += existing is None
+        self.storage.upsert_tasks(imported)
+        if imported:
+            self.queue_task_changes("update", imported)
+        return created, len(imported) - created
+
+    #Số liệu như cửa sổ Thống kê: theo trạng thái, theo dự án/người phụ trách và số hoàn thành theo tuần
+    def collect_stats(self):
+        now = int(datetime.now().timestamp())
+        completions = CompletionCounter()
+        completions.load(self.storage.iter_history())
+        stats = {
+            "total": len(self.tasks),
+            "status": {status: self.tasks.count("status", status) for status in ["Todo", "In Progress", "Done"]},
+            "overdue": self.tasks.overdue_count(now),
+            "near_deadline": self.tasks.near_deadline_count(now),
+            "pending_writes": len(self.pending_writes),
+            "weekly_done": {week: completions.weeks[week] for week in sorted(completions.weeks, reverse=True)}
+        }
+        for field in TaskStore.GROUPED_FIELDS:
+            overdue = self.tasks.overdue_by(field, now)
+            stats[field] = {
+                value: dict(self.tasks.status_counts(field, value), total=self.tasks.count(field, value), overdue=overdue[value])
+                for value in self.tasks.groups(field)
+            }
+        return stats
+
+# Hàm in thống kê dạng bảng chữ
+def print_stats(stats):
+    print(f"Tổng: {stats['total']}  |  " + "  |  ".join(f"{status}: {count}" for status, count in stats["status"].items())
+          + f"  |  Quá hạn: {stats['overdue']}  |  Sắp đến hạn: {stats['near_deadline']}  |  Chờ ghi lên sheet: {stats['pending_writes']}")
+    for field, title in (("project_name", "Theo dự án"), ("assignee", "Theo người phụ trách")):
+        print(f"\n{title}")
+        print(f"  {'':<40} {'Tổng':>7} {'Todo':>7} {'In Progress':>12} {'Done':>7} {'Quá hạn':>8}")
+        for value, counts in stats[field].items():
+            print(f"  {value[:40]:<40} {counts['total']:>7} {counts.get('Todo', 0):>7} {counts.get('In Progress', 0):>12} "
+                  f"{counts.get('Done', 0):>7} {counts['overdue']:>8}")
+    print("\nHoàn thành theo tuần")
+    for week, count in stats["weekly_done"].items():
+        print(f"  {week}  {count}")
+
+# Hàm chạy một lệnh không giao diện, trả về mã thoát
+def run_command(args):
+    app = HeadlessApp()
+    needs_sheets = args.command == "sync" or getattr(args, "sync", False) or (args.command == "import" and not args.no_push)
+    if needs_sheets and not sheets_configured(app.config):
+        logging.error(f"Chưa cấu hình Google Sheets: cần ID hai spreadsheet và tệp credentials trong {CONFIG_FILE}")
+        return EXIT_NOT_CONFIGURED
+    
+    if args.command == "sync" and args.daemon:
+        interval = args.interval or app.config.get("LIVE_POLL_SECONDS") or LIVE_POLL_SECONDS
+        stop = threading.Event()
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda *_: stop.set())
+        app.run_daemon(interval, stop)
+        return EXIT_OK
+    if needs_sheets and args.command != "import" and not app.sync():
+        return EXIT_FAILED
+    
+    try:
+        if args.command == "sync":
+            logging.info(f"Đồng bộ xong: {len(app.tasks)} công việc, {len(app.users)} người dùng")
+        elif args.command == "export":
+            export_tasks(app.tasks, args.file)
+            logging.info(f"Đã xuất {len(app.tasks)} công việc ra {args.file}")
+        elif args.command == "import":
+            created, updated = app.import_tasks(read_task_file(args.file), args.user)
+            logging.info(f"Đã nhập {created} công việc mới và {updated} công việc cập nhật từ {args.file}")
+            # Lỗi ở từng công việc vẫn nhập phần còn lại, nhưng lệnh kết thúc với mã lỗi
+            failed = bool(app.errors)
+            if needs_sheets and not app.sync():
+                return EXIT_FAILED
+            if failed:
+                return EXIT_FAILED
+        elif args.command == "stats":
+            stats = app.collect_stats()
+            if args.json:
+                print(json.dumps(stats, ensure_ascii=False, indent=4))
+            else:
+                print_stats(stats)
+    except (OSError, ValueError) as e:
+        logging.error(f"Không thể thực hiện lệnh {args.command}: {e}")
+        return EXIT_FAILED
+    return EXIT_OK
+
+# Hàm khởi động: không có lệnh thì mở giao diện, có lệnh thì chạy không giao diện và trả về mã thoát
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quản lý Công Việc Dự Án. Không có lệnh thì mở giao diện.")
+    parser.add_argument("--log-file", help="ghi log vào file thay vì stderr")
+    parser.add_argument("--verbose", "-v", action="store_true", help="ghi cả log chi tiết")
+    commands = parser.add_subparsers(dest="command")
+    
+    sync_parser = commands.add_parser("sync", help="đối chiếu dữ liệu trên máy với Google Sheets")
+    sync_parser.add_argument("--daemon", action="store_true", help="chạy liên tục, đối chiếu sau mỗi --interval giây")
+    sync_parser.add_argument("--interval", type=float, help=f"số giây giữa hai lượt (mặc định LIVE_POLL_SECONDS, {LIVE_POLL_SECONDS})")
+    export_parser = commands.add_parser("export", help="xuất công việc ra file .csv hoặc .json")
+    export_parser.add_argument("file")
+    export_parser.add_argument("--sync", action="store_true", help="đồng bộ trước khi xuất")
+    import_parser = commands.add_parser("import", help="nhập công việc từ file .csv hoặc .json rồi ghi lên Google Sheets")
+    import_parser.add_argument("file")
+    import_parser.add_argument("--user", default="cli", help="tên ghi vào Last Modified By và lịch sử (mặc định cli)")
+    import_parser.add_argument("--no-push", action="store_true", help="chỉ lưu trên máy và outbox, lượt đồng bộ sau sẽ gửi")
+    stats_parser = commands.add_parser("stats", help="in thống kê công việc")
+    stats_parser.add_argument("--json", action="store_true", help="in dạng JSON")
+    stats_parser.add_argument("--sync", action="store_true", help="đồng bộ trước khi thống kê")
+    args = parser.parse_args(argv)
+    
+    if args.command is None:
+        if tk is None:
+            print("Không có tkinter, chỉ chạy được các lệnh sync, export, import, stats (xem --help)", file=sys.stderr)
+            return EXIT_USAGE
+        logging.basicConfig(level=logging.INFO, format="%(message)s")
+        root = tk.Tk()
+        ProjectManagementApp(root)
+        root.mainloop()
+        return EXIT_OK
+    
+    logging.basicConfig(
+        filename=args.log_file,
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(asctime)s %(levelname)s %(message)s"
+    )
+    return run_command(args)
+
 if __name__ == "__main__":
-    root = tk.Tk()
-    app = ProjectManagementApp(root)
-    root.mainloop()
+    sys.exit(main())
@@ -0,0 +1,439 @@
+import argparse
+import collections
+import json
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+# Thư mục chứa DeTai.py
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Thời gian import DeTai tối đa (ms) khi khởi động nguội
+IMPORT_BUDGET_MS = 150
+# Các thư viện nặng chỉ được import khi cần, không được nạp cùng DeTai
+LAZY_MODULES = ["gspread", "google.oauth2", "google.auth", "requests"]
+
+# Số công việc và số người dùng mặc định của các bộ dữ liệu tổng hợp
+DATASET_SIZES = [1000, 10000, 100000]
+DATASET_USERS = {1000: 100, 10000: 1000, 100000: 1000}
+# Độ trễ giả lập (ms) của mỗi lần gọi Google Sheets API
+DEFAULT_LATENCY_MS = 20
+
+IMPORTTIME_LINE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)\s*$")
+
+# Hàm chạy "python -X importtime -c 'import DeTai'" trong tiến trình mới và đọc kết quả.
+# Trả về danh sách (tên module, self µs, cumulative µs, độ sâu) theo thứ tự in ra
+def measure_import_time():
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import DeTai"],
+        cwd=APP_DIR, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Không thể import DeTai: {result.stderr.strip().splitlines()[-1:]}")
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules.append((name, int(self_us), int(cumulative_us), (len(indent) - 1) // 2))
+    return modules
+
+# Hàm kiểm tra thời gian import so với ngân sách, in các module tốn thời gian nhất. Trả về mã thoát
+def run_importtime(args):
+    modules = measure_import_time()
+    app = next((module for module in modules if module[0] == "DeTai"), None)
+    if app is None:
+        print("Không tìm thấy DeTai trong kết quả -X importtime")
+        return 1
+    total_ms = app[2] / 1000
+
+    print(f"Thời gian import DeTai: {total_ms:.1f} ms (ngân sách {args.budget_ms} ms)")
+    # -X importtime in module con trước module cha: các module DeTai import trực tiếp
+    # là các dòng độ sâu 1 ngay phía trên dòng DeTai
+    position = modules.index(app)
+    children = []
+    while position > 0 and modules[position - 1][3] > 0:
+        position -= 1
+        if modules[position][3] == 1:
+            children.append(modules[position])
+    print("Các module DeTai import tốn thời gian nhất (cumulative):")
+    for name, self_us, cumulative_us, _ in sorted(children, key=lambda module: -module[2])[:args.top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms  {name}")
+
+    status = 0
+    loaded = {module[0] for module in modules}
+    eager = [name for name in LAZY_MODULES if name in loaded or any(m.startswith(name + ".") for m in loaded)]
+    if eager:
+        print(f"Lỗi: các module sau phải được import khi cần nhưng đã nạp cùng DeTai: {', '.join(eager)}")
+        status = 1
+    if total_ms > args.budget_ms:
+        print(f"Lỗi: vượt ngân sách khởi động {total_ms - args.budget_ms:.1f} ms")
+        status = 1
+    return status
+
+# Treeview giả lập (không cần màn hình): giữ các dòng trong dict và đếm số lần gọi
+class StubTreeview:
+    def __init__(self):
+        self.rows = {}
+        self.order = []
+        self.calls = collections.Counter()
+
+    def insert(self, parent, index, iid=None, values=(), tags=()):
+        self.calls["insert"] += 1
+        self.rows[iid] = {"values": values, "tags": tags}
+        self.order.insert(index if index != "end" else len(self.order), iid)
+        return iid
+
+    def item(self, iid, **options):
+        self.calls["item"] += 1
+        if not options:
+            return self.rows[iid]
+        self.rows[iid].update(options)
+
+    def set(self, iid, column, value):
+        self.calls["set"] += 1
+
+    def move(self, iid, parent, index):
+        self.calls["move"] += 1
+        self.order.remove(iid)
+        self.order.insert(index, iid)
+
+    def delete(self, *iids):
+        self.calls["delete"] += 1
+        for iid in iids:
+            del self.rows[iid]
+        removed = set(iids)
+        self.order = [iid for iid in self.order if iid not in removed]
+
+    def exists(self, iid):
+        return iid in self.rows
+
+    def get_children(self):
+        return tuple(self.order)
+
+    def selection(self):
+        return ()
+
+    def winfo_exists(self):
+        return True
+
+    def configure(self, **options):
+        pass
+
+    def yview(self, *args):
+        pass
+
+    def yview_moveto(self, fraction):
+        pass
+
+# Các widget và biến Tk tối thiểu mà các hàm được đo có dùng tới
+class StubScrollbar:
+    def set(self, first, last):
+        pass
+
+    def configure(self, **options):
+        pass
+
+class StubMenu:
+    def delete(self, first, last):
+        pass
+
+    def add_command(self, **options):
+        pass
+
+    def entryconfigure(self, index, **options):
+        pass
+
+class StubVar:
+    def __init__(self, value=""):
+        self.value = value
+
+    def get(self):
+        return self.value
+
+    def set(self, value):
+        self.value = value
+
+# root.after chỉ ghi lại lời gọi; benchmark tự chạy chúng ngay thay vì chờ vòng lặp Tk
+class StubRoot:
+    def __init__(self):
+        self.scheduled = []
+
+    def after(self, delay, func=None, *args):
+        self.scheduled.append((func, args))
+        return f"after#{len(self.scheduled)}"
+
+    # Chạy các lời gọi đã hẹn, bỏ qua các vòng kiểm tra định kỳ (benchmark tự gọi poll_sync_results)
+    def run_scheduled(self):
+        scheduled, self.scheduled = self.scheduled, []
+        ran = 0
+        for func, args in scheduled:
+            if getattr(func, "__name__", "") not in ("poll_sync_results", "refresh_deadline_tags", "start_live_poll"):
+                func(*args)
+                ran += 1
+        return ran
+
+    def after_cancel(self, after_id):
+        pass
+
+# messagebox giả: lỗi hiện ra trong giao diện sẽ làm benchmark dừng thay vì mở hộp thoại
+class RaisingMessagebox:
+    @staticmethod
+    def showerror(title, message, **options):
+        raise RuntimeError(message)
+
+    @staticmethod
+    def showinfo(title, message, **options):
+        pass
+
+    @staticmethod
+    def askyesno(title, message, **options):
+        return True
+
+WORDS = ["báo cáo", "thiết kế", "kiểm thử", "triển khai", "họp", "tài liệu", "giao diện", "dữ liệu",
+         "đồng bộ", "máy chủ", "khách hàng", "hợp đồng", "ngân sách", "đào tạo", "bảo trì", "phân tích"]
+STATUSES = ["Todo", "In Progress", "Done"]
+
+# Hàm sinh bộ dữ liệu tổng hợp cố định theo seed: danh sách người dùng và công việc
+def make_dataset(task_count, user_count, seed=42):
+    rng = random.Random(seed)
+    users = {
+        f"user{i:05d}": {"password": f"pw{i}", "full_name": f"Người dùng {i}", "role": "admin" if i == 0 else "user"}
+        for i in range(user_count)
+    }
+    full_names = [info["full_name"] for info in users.values()]
+    projects = [f"Dự án {i}" for i in range(max(1, min(50, task_count // 100)))]
+    base = int(time.time())
+    tasks = []
+    for i in range(task_count):
+        created = base - rng.randint(30, 90) * 86400
+        modified = created + rng.randint(0, 20) * 86400
+        tasks.append({
+            "id": f"{i:08x}-bench",
+            "title": f"{rng.choice(WORDS).capitalize()} {rng.choice(WORDS)} {i}",
+            "description": " ".join(rng.choice(WORDS) for _ in range(8)),
+            "assignee": rng.choice(full_names),
+            "project_name": rng.choice(projects),
+            "status": rng.choice(STATUSES),
+            "deadline": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(base + rng.randint(-30, 30) * 86400)),
+            "notes": rng.choice(WORDS) if rng.random() < 0.3 else "",
+            "created_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(created)),
+            "created_by": "user00000",
+            "last_modified_by": "user00000",
+            "last_modified_at": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(modified))
+        })
+    return users, tasks
+
+# Hàm dựng ProjectManagementApp không có cửa sổ: sheet cục bộ trong bộ nhớ, Treeview và luồng nền giả lập
+def make_app(DeTai, backend, sheet_backend, task_sheet, login_sheet, sharding=""):
+    app = object.__new__(DeTai.ProjectManagementApp)
+    app.root = StubRoot()
+    # Cấu hình được ghi ra file để init_sync_state đọc như khi chạy thật; luồng nền chạy ngay trong luồng gọi
+    # để thời gian và số lần gọi API được tính vào thao tác đang đo
+    DeTai.write_json(DeTai.CONFIG_FILE, {
+        "TASK_SPREADSHEET_ID": "bench-tasks",
+        "LOGIN_SPREADSHEET_ID": "bench-login",
+        "TASK_SHEET_NAME": "Phân công",
+        "LOGIN_SHEET_NAME": "Thông tin đăng nhập",
+        "CREDENTIALS_FILE": "",
+        "SYNC_MODE": "incremental",
+        "SYNC_WATERMARKS": {},
+        "TREE_VIRTUAL_THRESHOLD": 2000,
+        "STORAGE_BACKEND": backend,
+        "SHEET_FINGERPRINTS": {},
+        "SHEET_BACKEND": "local",
+        "TASK_SHARDING": sharding
+    })
+    app.init_sync_state(DeTai.InlineSyncWorker())
+    app.current_user = None
+    app.is_admin = False
+    app.users = {}
+    app.tasks = DeTai.TaskStore()
+
+    # Giữ nguyên các sheet đã dựng sẵn thay vì mở lại mỗi lần đối chiếu
+    app.sheet_backend = sheet_backend
+    app.task_sheet, app.login_sheet = task_sheet, login_sheet
+    app.task_spreadsheet, app.login_spreadsheet = task_sheet.spreadsheet, login_sheet.spreadsheet
+    app.task_shards = DeTai.TaskShards(task_sheet.spreadsheet, task_sheet, None, sharding)
+    app.connect_sheet_api = app.open_task_sheet = app.open_login_sheet = lambda: None
+
+    app.tree = StubTreeview()
+    app.tree_scrollbar = StubScrollbar()
+    app.tree_rows = {}
+    app.tree_order = []
+    app.visible_tasks = []
+    app.tree_virtual = False
+    app.tree_offset = 0
+    app.tree_visible_rows = 20
+    app.view_mode = StubVar("all")
+    app.project_var = StubVar("Tất cả")
+    app.project_menu = {"menu": StubMenu()}
+    app.project_menu_names = None
+    app.search_entry = StubVar("")
+    app.search_after_id = None
+    return app
+
+# Hàm chạy một lượt đối chiếu với sheet như setup_google_sheets, xử lý hết kết quả từ luồng nền
+def reconcile(app):
+    watermark = app.config["SYNC_WATERMARKS"].get(app.sync_watermark_key(), "")
+    local_ids = frozenset(task.id for task in app.tasks) if watermark else frozenset()
+    app.sync_worker.submit("reconcile", app.fetch_sheet_snapshot,
+                           dict(app.config["SHEET_FINGERPRINTS"]), bool(app.users), bool(app.tasks),
+                           watermark, local_ids)
+    run_pending(app)
+
+# Hàm chạy một lượt thăm dò thay đổi trên sheet Phân công và áp dụng kết quả
+def live_poll(app):
+    app.start_live_poll()
+    run_pending(app)
+
+# Hàm xử lý hết kết quả từ luồng nền và các lời gọi đã hẹn, kể cả những gì chúng sinh ra
+def run_pending(app):
+    while not app.sync_worker.results.empty() or app.root.run_scheduled():
+        app.poll_sync_results()
+
+# Hàm đo một thao tác: thời gian, số lần gọi API (theo từng loại) và bộ nhớ cấp phát tối đa
+def measure(name, func, sheet_backend, tree):
+    sheet_backend.calls.clear()
+    tree.calls.clear()
+    tracemalloc.start()
+    started = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    api_calls = collections.Counter(sheet_backend.calls)
+    return {
+        "operation": name,
+        "wall_ms": round(elapsed * 1000, 2),
+        "api_calls": sum(api_calls.values()),
+        "api_detail": dict(api_calls),
+        "tree_calls": sum(tree.calls.values()),
+        "peak_kb": round(peak / 1024, 1)
+    }
+
+# Hàm chạy các thao tác nóng trên một bộ dữ liệu, trả về danh sách kết quả
+def run_dataset(DeTai, task_count, user_count, backend, latency_ms, sharding=""):
+    users, tasks = make_dataset(task_count, user_count)
+    sheet_backend = DeTai.LocalSheetBackend(directory=None, latency_ms=latency_ms)
+    task_sheet = sheet_backend.open_spreadsheet("bench-tasks").add_worksheet("Phân công")
+    login_sheet = sheet_backend.open_spreadsheet("bench-login").add_worksheet("Thông tin đăng nhập")
+    login_sheet.rows = [DeTai.USER_HEADERS] + [
+        [username, info["password"], info["full_name"], info["role"]] for username, info in users.items()
+    ]
+    app = make_app(DeTai, backend, sheet_backend, task_sheet, login_sheet, sharding)
+    # Ghi sẵn các công việc vào shard sở hữu (sheet Phân công khi không chia)
+    for task in map(DeTai.Task.from_dict, tasks):
+        sheet = app.task_shards.sheet_for(app.task_shards.key_for(task))
+        if not sheet.rows:
+            sheet.rows.append(list(DeTai.TASK_HEADERS))
+        sheet.rows.append(task.to_row())
+    results = []
+
+    def run(name, func):
+        results.append(measure(name, func, sheet_backend, app.tree))
+
+    run("sync (lần đầu, toàn bộ)", lambda: reconcile(app))
+
+    # Sửa 1% số dòng trên sheet rồi đồng bộ tăng dần
+    def edit_sheet(seconds=0):
+        modified_at = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time() + seconds))
+        rows = [row for sheet in app.task_shards.sheets.values() for row in sheet.rows[1:]]
+        for row in rows[::100]:
+            row[1] = row[1] + " (sửa)"
+            row[11] = modified_at
+        task_sheet.spreadsheet.revision += 1
+    edit_sheet()
+    run("sync (tăng dần, 1% dòng đổi)", lambda: reconcile(app))
+    run("sync (không đổi)", lambda: reconcile(app))
+
+    app.current_user = next(iter(users))
+    app.is_admin = True
+    run("load_tasks (lần đầu)", app.load_tasks)
+    run("load_tasks (vẽ lại)", app.load_tasks)
+
+    project = tasks[0]["project_name"]
+    app.project_var.set(project)
+    run("filter_tasks_by_project", app.filter_tasks_by_project)
+    app.project_var.set("Tất cả")
+    run("filter_tasks_by_project (tất cả)", app.filter_tasks_by_project)
+
+    app.search_entry.set("thiết kế")
+    run("search_tasks (dựng chỉ mục)", app.search_tasks)
+    app.search_entry.set("dữ liệu 12")
+    run("search_tasks", app.search_tasks)
+
+    run("thăm dò (lần đầu)", lambda: live_poll(app))
+    edit_sheet(60)
+    run("thăm dò (1% dòng đổi)", lambda: live_poll(app))
+    run("thăm dò (không đổi)", lambda: live_poll(app))
+
+    task = app.tasks.get(tasks[task_count // 2]["id"])
+    run("lưu một công việc", lambda: app.storage.upsert_tasks([app.tasks.update(task.id, {"status": "Done"})]))
+    run("log_history x100", lambda: [app.log_history("Updated", task) for _ in range(100)])
+
+    app.storage.connection.close() if hasattr(app.storage, "connection") else None
+    return results
+
+# Hàm đo các đường nóng (đồng bộ, vẽ, tìm kiếm, lưu) trên các bộ dữ liệu tổng hợp
+def run_hotpaths(args):
+    sys.path.insert(0, APP_DIR)
+    import DeTai
+    DeTai.messagebox = RaisingMessagebox
+
+    report = []
+    working_dir = os.getcwd()
+    for task_count in args.sizes:
+        user_count = args.users or DATASET_USERS.get(task_count, 1000)
+        with tempfile.TemporaryDirectory() as temp_dir:
+            # DeTai ghi các file dữ liệu vào thư mục hiện tại
+            os.chdir(temp_dir)
+            try:
+                results = run_dataset(DeTai, task_count, user_count, args.backend, args.latency_ms, args.sharding)
+            finally:
+                os.chdir(working_dir)
+        sharding = DeTai.TASK_SHARDING_LABELS[args.sharding]
+        print(f"\n{task_count} công việc, {user_count} người dùng (lưu trữ {args.backend}, độ trễ API {args.latency_ms} ms, "
+              f"chia sheet Phân công: {sharding})")
+        print(f"  {'Thao tác':<34}{'Thời gian (ms)':>15}{'API':>6}{'Treeview':>10}{'Bộ nhớ (KB)':>13}")
+        for result in results:
+            print(f"  {result['operation']:<34}{result['wall_ms']:>15.1f}{result['api_calls']:>6}"
+                  f"{result['tree_calls']:>10}{result['peak_kb']:>13.0f}")
+        report.append({"tasks": task_count, "users": user_count, "backend": args.backend,
+                       "latency_ms": args.latency_ms, "sharding": args.sharding, "results": results})
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as file:
+            json.dump(report, file, ensure_ascii=False, indent=2)
+        print(f"\nĐã ghi kết quả vào {args.json}")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Đo hiệu năng ứng dụng Quản lý Công Việc Dự Án")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    importtime = commands.add_parser("importtime", help="đo thời gian import DeTai bằng -X importtime")
+    importtime.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    importtime.add_argument("--top", type=int, default=10)
+    importtime.set_defaults(func=run_importtime)
+
+    hotpaths = commands.add_parser("hotpaths", help="đo đồng bộ, vẽ Treeview, tìm kiếm và lưu trữ trên dữ liệu tổng hợp")
+    hotpaths.add_argument("--sizes", type=int, nargs="+", default=DATASET_SIZES)
+    hotpaths.add_argument("--users", type=int, default=None)
+    hotpaths.add_argument("--backend", choices=["sqlite", "json"], default="sqlite")
+    hotpaths.add_argument("--latency-ms", type=float, default=DEFAULT_LATENCY_MS)
+    hotpaths.add_argument("--sharding", choices=["", "project", "hash"], default="",
+                          help="chia sheet Phân công theo dự án hoặc theo băm ID")
+    hotpaths.add_argument("--json", help="ghi kết quả ra file JSON để so sánh giữa các lần chạy")
+    hotpaths.set_defaults(func=run_hotpaths)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())